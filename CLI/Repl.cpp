@@ -8,6 +8,7 @@
 #include "Luau/Compiler.h"
 #include "Luau/BytecodeBuilder.h"
 #include "Luau/Parser.h"
+#include "Luau/TimeTrace.h"
 
 #include "Coverage.h"
 #include "FileUtils.h"
@@ -17,6 +18,7 @@
 #include "isocline.h"
 
 #include <memory>
+#include <vector>
 
 #ifdef _WIN32
 #include <io.h>
@@ -30,6 +32,10 @@
 #include <valgrind/callgrind.h>
 #endif
 
+#ifdef __APPLE__
+#include <sys/resource.h>
+#endif
+
 #include <locale.h>
 #include <signal.h>
 
@@ -40,7 +46,8 @@ enum class CliMode
     Unknown,
     Repl,
     Compile,
-    RunSourceFiles
+    RunSourceFiles,
+    Server
 };
 
 enum class CompileFormat
@@ -56,7 +63,63 @@ enum class CompileFormat
 
 constexpr int MaxTraversalLimit = 50;
 
+// Printed on a separate line after each script in server mode
+constexpr const char* ServerDoneMarker = "--luau-server-done";
+
 static bool codegen = false;
+static bool gcStats = false;
+
+struct GcStats
+{
+    bool inStep = false;
+    double stepStart = 0;
+    size_t stepStartBytes = 0;
+
+    uint64_t steps = 0;
+    uint64_t cycles = 0;
+    double pauseTime = 0;
+
+    // bytes reclaimed by collection steps; together with heap growth this gives the amount of allocated memory
+    double freedBytes = 0;
+
+    // durations of steps since the last call to gcstats()
+    std::vector<double> pauses;
+} gGcStats;
+
+static size_t getHeapBytes(lua_State* L)
+{
+    return size_t(lua_gc(L, LUA_GCCOUNT, 0)) * 1024 + size_t(lua_gc(L, LUA_GCCOUNTB, 0));
+}
+
+// GC steps invoke the interrupt with gc=0 before the step and with the state that the step started in after it
+static void gcStatsCallback(lua_State* L, int gc)
+{
+    if (gc < 0)
+        return;
+
+    if (!gGcStats.inStep)
+    {
+        gGcStats.inStep = true;
+        gGcStats.stepStartBytes = getHeapBytes(L);
+        gGcStats.stepStart = lua_clock();
+        return;
+    }
+
+    double pause = lua_clock() - gGcStats.stepStart;
+    size_t bytes = getHeapBytes(L);
+
+    gGcStats.inStep = false;
+    gGcStats.steps++;
+    gGcStats.pauseTime += pause;
+    gGcStats.pauses.push_back(pause);
+
+    if (bytes < gGcStats.stepStartBytes)
+        gGcStats.freedBytes += double(gGcStats.stepStartBytes - bytes);
+
+    // a step that started in the pause state has started a new cycle
+    if (gc == 0)
+        gGcStats.cycles++;
+}
 
 // Ctrl-C handling
 static void sigintCallback(lua_State* L, int gc)
@@ -220,6 +283,74 @@ static int lua_collectgarbage(lua_State* L)
     luaL_error(L, "collectgarbage must be called with 'count' or 'collect'");
 }
 
+// Peak resident set size of this process in KB, or nil if it's not available
+static int lua_peakrss(lua_State* L)
+{
+#if defined(__linux__)
+    // getrusage can't be used on Linux, since it keeps the peak of the process that started us from before exec
+    if (FILE* file = fopen("/proc/self/status", "r"))
+    {
+        char line[256];
+        long long peak = -1;
+
+        while (peak < 0 && fgets(line, sizeof(line), file))
+            if (sscanf(line, "VmHWM: %lld kB", &peak) != 1)
+                peak = -1;
+
+        fclose(file);
+
+        if (peak >= 0)
+        {
+            lua_pushnumber(L, double(peak));
+            return 1;
+        }
+    }
+#elif defined(__APPLE__)
+    struct rusage usage;
+
+    // reported in bytes on macOS
+    if (getrusage(RUSAGE_SELF, &usage) == 0)
+    {
+        lua_pushnumber(L, double(usage.ru_maxrss) / 1024);
+        return 1;
+    }
+#endif
+
+    lua_pushnil(L);
+    return 1;
+}
+
+static int lua_gcstats(lua_State* L)
+{
+    lua_createtable(L, 0, 5);
+
+    lua_pushnumber(L, double(gGcStats.steps));
+    lua_setfield(L, -2, "steps");
+
+    lua_pushnumber(L, double(gGcStats.cycles));
+    lua_setfield(L, -2, "cycles");
+
+    lua_pushnumber(L, gGcStats.pauseTime);
+    lua_setfield(L, -2, "pausetime");
+
+    lua_pushnumber(L, gGcStats.freedBytes);
+    lua_setfield(L, -2, "freed");
+
+    lua_createtable(L, int(gGcStats.pauses.size()), 0);
+
+    for (size_t i = 0; i < gGcStats.pauses.size(); ++i)
+    {
+        lua_pushnumber(L, gGcStats.pauses[i]);
+        lua_rawseti(L, -2, int(i + 1));
+    }
+
+    lua_setfield(L, -2, "pauses");
+
+    gGcStats.pauses.clear();
+
+    return 1;
+}
+
 #ifdef CALLGRIND
 static int lua_callgrind(lua_State* L)
 {
@@ -261,6 +392,7 @@ void setupState(lua_State* L)
         {"loadstring", lua_loadstring},
         {"require", lua_require},
         {"collectgarbage", lua_collectgarbage},
+        {"peakrss", lua_peakrss},
 #ifdef CALLGRIND
         {"callgrind", lua_callgrind},
 #endif
@@ -271,6 +403,14 @@ void setupState(lua_State* L)
     luaL_register(L, NULL, funcs);
     lua_pop(L, 1);
 
+    if (gcStats)
+    {
+        lua_pushcfunction(L, lua_gcstats, "gcstats");
+        lua_setglobal(L, "gcstats");
+
+        lua_callbacks(L)->interrupt = gcStatsCallback;
+    }
+
     luaL_sandbox(L);
 }
 
@@ -660,6 +800,50 @@ static bool runFile(const char* name, lua_State* GL, bool repl)
     return status == 0;
 }
 
+static void runServer()
+{
+    char buffer[4096];
+    std::string path;
+
+    while (fgets(buffer, sizeof(buffer), stdin))
+    {
+        path += buffer;
+
+        // keep reading until we have the entire line
+        if (path.back() != '\n' && !feof(stdin))
+            continue;
+
+        while (!path.empty() && (path.back() == '\n' || path.back() == '\r'))
+            path.pop_back();
+
+        if (!path.empty())
+        {
+#if defined(__linux__)
+            // reset the peak resident set size, so that every script reports its own peak
+            if (FILE* file = fopen("/proc/self/clear_refs", "w"))
+            {
+                fputs("5", file);
+                fclose(file);
+            }
+#endif
+
+            // every script gets a fresh VM state so that scripts can't affect each other
+            std::unique_ptr<lua_State, void (*)(lua_State*)> globalState(luaL_newstate(), lua_close);
+            lua_State* L = globalState.get();
+
+            setupState(L);
+
+            bool success = runFile(path.c_str(), L, false);
+
+            fflush(stderr);
+            printf("\n%s %d\n", ServerDoneMarker, success ? 0 : 1);
+            fflush(stdout);
+        }
+
+        path.clear();
+    }
+}
+
 static void report(const char* name, const Luau::Location& location, const char* type, const char* message)
 {
     fprintf(stderr, "%s(%d,%d): %s: %s\n", name, location.begin.line + 1, location.begin.column + 1, type, message);
@@ -699,6 +883,25 @@ struct CompileStats
     size_t lines;
     size_t bytecode;
     size_t codegen;
+
+    size_t files;
+    size_t source;
+    size_t functions;
+
+    double parseTime;
+    double compileTime;
+    double codegenTime;
+};
+
+struct FunctionCounter : Luau::AstVisitor
+{
+    size_t count = 0;
+
+    bool visit(Luau::AstExprFunction* node) override
+    {
+        count++;
+        return true;
+    }
 };
 
 static bool compileFile(const char* name, CompileFormat format, CompileStats& stats)
@@ -736,6 +939,8 @@ static bool compileFile(const char* name, CompileFormat format, CompileStats& st
             bcb.setDumpSource(*source);
         }
 
+        double parseStart = Luau::TimeTrace::getClock();
+
         Luau::Allocator allocator;
         Luau::AstNameTable names(allocator);
         Luau::ParseResult result = Luau::Parser::parse(source->c_str(), source->size(), names, allocator);
@@ -745,8 +950,22 @@ static bool compileFile(const char* name, CompileFormat format, CompileStats& st
 
         stats.lines += result.lines;
 
+        double compileStart = Luau::TimeTrace::getClock();
+
         Luau::compileOrThrow(bcb, result, names, copts());
+
+        double compileEnd = Luau::TimeTrace::getClock();
+
+        // main chunk is a function as well
+        FunctionCounter counter;
+        result.root->visit(&counter);
+
         stats.bytecode += bcb.getBytecode().size();
+        stats.files++;
+        stats.source += source->size();
+        stats.functions += counter.count + 1;
+        stats.parseTime += compileStart - parseStart;
+        stats.compileTime += compileEnd - compileStart;
 
         switch (format)
         {
@@ -764,8 +983,12 @@ static bool compileFile(const char* name, CompileFormat format, CompileStats& st
             printf("%s", getCodegenAssembly(name, bcb.getBytecode(), options).c_str());
             break;
         case CompileFormat::CodegenNull:
+        {
+            double codegenStart = Luau::TimeTrace::getClock();
             stats.codegen += getCodegenAssembly(name, bcb.getBytecode(), options).size();
+            stats.codegenTime += Luau::TimeTrace::getClock() - codegenStart;
             break;
+        }
         case CompileFormat::Null:
             break;
         }
@@ -794,6 +1017,7 @@ static void displayHelp(const char* argv0)
     printf("Available modes:\n");
     printf("  omitted: compile and run input files one by one\n");
     printf("  --compile[=format]: compile input files and output resulting bytecode/assembly (binary, text, remarks, codegen)\n");
+    printf("  --server: run files whose paths are read from standard input line by line, printing '%s <status>' after each one\n", ServerDoneMarker);
     printf("\n");
     printf("Available options:\n");
     printf("  --coverage: collect code coverage while running the code and output results to coverage.out\n");
@@ -803,7 +1027,9 @@ static void displayHelp(const char* argv0)
     printf("  -g<n>: compile with debug level n (default 1, n should be between 0 and 2).\n");
     printf("  --profile[=N]: profile the code using N Hz sampling (default 10000) and output results to profile.out\n");
     printf("  --timetrace: record compiler time tracing information into trace.json\n");
+    printf("  --compile-stats: with --compile, print source size, function count and parse/compile/codegen time to stderr\n");
     printf("  --codegen: execute code using native code generation\n");
+    printf("  --gc-stats: record the duration of every GC step and provide them with the amount of cycles and freed memory through gcstats()\n");
 }
 
 static int assertionHandler(const char* expr, const char* file, int line, const char* function)
@@ -823,6 +1049,7 @@ int replMain(int argc, char** argv)
     int profile = 0;
     bool coverage = false;
     bool interactive = false;
+    bool compileStats = false;
 
     // Set the mode if the user has explicitly specified one.
     int argStart = 1;
@@ -868,6 +1095,11 @@ int replMain(int argc, char** argv)
             return 1;
         }
     }
+    else if (argc >= 2 && strcmp(argv[1], "--server") == 0)
+    {
+        argStart++;
+        mode = CliMode::Server;
+    }
 
     for (int i = argStart; i < argc; i++)
     {
@@ -916,6 +1148,14 @@ int replMain(int argc, char** argv)
         {
             coverage = true;
         }
+        else if (strcmp(argv[i], "--compile-stats") == 0)
+        {
+            compileStats = true;
+        }
+        else if (strcmp(argv[i], "--gc-stats") == 0)
+        {
+            gcStats = true;
+        }
         else if (strcmp(argv[i], "--timetrace") == 0)
         {
             FFlag::DebugLuauTimeTracing.value = true;
@@ -948,6 +1188,12 @@ int replMain(int argc, char** argv)
     }
 #endif
 
+    if (gcStats && profile)
+    {
+        fprintf(stderr, "--gc-stats can't be combined with --profile, they both use the interrupt callback\n");
+        return 1;
+    }
+
     const std::vector<std::string> files = getSourceFiles(argc, argv);
     if (mode == CliMode::Unknown)
     {
@@ -981,6 +1227,14 @@ int replMain(int argc, char** argv)
             printf("Compiled %d KLOC into %d KB bytecode => %d KB native code\n", int(stats.lines / 1000), int(stats.bytecode / 1024),
                 int(stats.codegen / 1024));
 
+        // stderr is used so that the stats can be recorded together with binary output
+        if (compileStats)
+            fprintf(stderr,
+                "Compile stats: files=%d lines=%d source=%d functions=%d bytecode=%d codegen=%d "
+                "parse=%.9f compile=%.9f codegentime=%.9f\n",
+                int(stats.files), int(stats.lines), int(stats.source), int(stats.functions), int(stats.bytecode), int(stats.codegen),
+                stats.parseTime, stats.compileTime, stats.codegenTime);
+
         return failed ? 1 : 0;
     }
     case CliMode::Repl:
@@ -988,6 +1242,11 @@ int replMain(int argc, char** argv)
         runRepl();
         return 0;
     }
+    case CliMode::Server:
+    {
+        runServer();
+        return 0;
+    }
     case CliMode::RunSourceFiles:
     {
         std::unique_ptr<lua_State, void (*)(lua_State*)> globalState(luaL_newstate(), lua_close);
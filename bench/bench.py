@@ -7,10 +7,24 @@ import math
 import sys
 import re
 import json
+import hashlib
+import socket
+import platform
+import tempfile
+import random
+import itertools
+import threading
+import time
+import fnmatch
+import queue
+from concurrent.futures import Future
 
 # Taken from rotest
 from color import colored, Color
 from tabulate import TablePrinter, Alignment
+from changepoint import estimate_noise, find_changepoints
+from benchresult import TestResult, parseCpuList, getResourceUsage, getResultExtras, setResultExtras, mergeResult, mergeResults, finalizeResult, getSignificance
+from benchresult import writeResultFile, decodeTestResult, loadResultFile
 
 try:
     import matplotlib
@@ -18,6 +32,11 @@ try:
 except ModuleNotFoundError:
     matplotlib = None
 
+try:
+    import numpy
+except ModuleNotFoundError:
+    numpy = None
+
 try:
     import scipy
     from scipy import stats
@@ -33,11 +52,38 @@ argumentParser = argparse.ArgumentParser(description='Benchmark Lua script execu
 argumentParser.add_argument('--vm', dest='vm',default=defaultVm,help='Lua executable to test (' + defaultVm + ' by default)')
 argumentParser.add_argument('--folder', dest='folder',default=os.path.join(scriptdir, 'tests'),help='Folder with tests (tests by default)')
 argumentParser.add_argument('--compare', dest='vmNext',type=str,nargs='*',help='List of Lua executables to compare against')
+argumentParser.add_argument('--gc-stats', dest='gc_stats',action='store_true',help='Run the VM with --gc-stats and report GC pause durations, GC share of the run time, collection cycles and memory allocated per iteration; time includes the overhead of the GC step callback')
+argumentParser.add_argument('--variant-groups', dest='variant_groups',nargs='?',const=os.path.join(scriptdir, 'micro_tests', 'variant_groups.json'),default=None,help='Report the fastest variant of each group of tests named test_<Group>_<Variant> with the relative cost of the others for every VM; only groups listed in the given JSON file are compared (micro_tests/variant_groups.json by default)')
+argumentParser.add_argument('--matrix', dest='matrix',type=str,action='append',default=None,help="Axis of a configuration matrix to run --vm with, as NAME=ARGS|ARGS|..., e.g. 'opt=-O0|-O1|-O2', 'codegen=|--codegen' or 'flags=|--fflags=LuauFlag'; every combination of all axes is compared to the first one")
 argumentParser.add_argument('--results', dest='results',type=str,nargs='*',help='List of json result files to compare and graph')
 argumentParser.add_argument('--run-test', action='store', default=None, help='Regex test filter')
 argumentParser.add_argument('--extra-loops', action='store',type=int,default=0, help='Amount of times to loop over one test (one test already performs multiple runs)')
 argumentParser.add_argument('--filename', action='store',type=str,default='bench', help='File name for graph and results file')
+argumentParser.add_argument('--resume', dest='resume',action='store_true',help='Reuse VM outputs streamed to the .jsonl results file by an earlier interrupted run with the same file name and only run the remaining work')
+argumentParser.add_argument('--baseline-cache', dest='baseline_cache',type=str,default=None,help='Folder to cache outputs of the --vm baseline in; they are reused while the VM binary, test, arguments, host and CPU governor stay the same')
+argumentParser.add_argument('--baseline-cache-max-age', dest='baseline_cache_max_age',type=float,default=168,help='Age in hours after which cached baseline outputs are measured again (168 by default)')
+argumentParser.add_argument('--baseline-cache-min-loops', dest='baseline_cache_min_loops',type=int,default=None,help='Amount of cached loops needed to reuse baseline outputs; smaller entries are extended by new measurements (loops of the current run by default)')
+argumentParser.add_argument('--preflight', dest='preflight',choices=['off', 'warn', 'strict'],default='off',help='Check CPU governor, turbo, core isolation, load, SMT siblings, thermal throttling and measurement noise before running on Linux; warn about problems, or also refuse to run when the noise is above --noise-threshold (off by default)')
+argumentParser.add_argument('--calibration-time', dest='calibration_time',type=float,default=0.5,help='Seconds spent measuring the noise floor of the benchmark cores during preflight (0.5 by default)')
+argumentParser.add_argument('--noise-threshold', dest='noise_threshold',type=lambda value: float(value.rstrip('%')),default=1.0,help='Expected confidence interval percentage of a test caused by measured noise, above which preflight complains (--target-ci or 1 by default)')
 argumentParser.add_argument('--callgrind', dest='callgrind',action='store_const',const=1,default=0,help='Use callgrind to run benchmarks')
+argumentParser.add_argument('--jobs', dest='jobs',type=int,default=None,help='Amount of VM processes to run in parallel, each one pinned to its own core (1 by default, all cores with --callgrind)')
+argumentParser.add_argument('--cores', dest='cores',type=str,default=None,help='List of cores to pin VM processes to, e.g. 2,4,6,8 or 2-8 (overrides --jobs)')
+argumentParser.add_argument('--no-smt', dest='no_smt',action='store_true',help='When picking cores for --jobs, only use one hardware thread of each physical core')
+argumentParser.add_argument('--order', dest='order',choices=['sequential', 'abba', 'rotate', 'random'],default='sequential',help='Order in which VMs are run within each round of a test: same order every round, reversed every other round, rotated every round or shuffled (sequential by default)')
+argumentParser.add_argument('--seed', dest='seed',type=int,default=0,help='Seed for the random execution order')
+argumentParser.add_argument('--target-ci', dest='target_ci',type=lambda value: float(value.rstrip('%')),default=None,help='Keep running extra loops of a test until the confidence interval is within this percentage of the average, or until the difference with each comparison VM is significant')
+argumentParser.add_argument('--max-time', dest='max_time',type=float,default=60.0,help='Stop running extra loops of a test for --target-ci after this many seconds (60 by default)')
+argumentParser.add_argument('--max-loops', dest='max_loops',type=int,default=100,help='Maximum amount of loops over one test for --target-ci (100 by default)')
+argumentParser.add_argument('--robust-stats', dest='robust_stats',action='store_true',help='Report percentiles and median absolute deviation over all samples including outliers, and compare VMs with a bootstrapped median speedup and a Mann-Whitney U test (requires numpy)')
+argumentParser.add_argument('--perf-stat', dest='perf_stat',action='store_true',help='Run VMs under Linux perf stat and compare hardware performance counters of each process')
+argumentParser.add_argument('--perf-events', dest='perf_events',type=str,default='instructions,cycles,branch-misses,L1-dcache-load-misses,LLC-load-misses',help='Comma-separated list of perf events to record with --perf-stat')
+argumentParser.add_argument('--callgrind-diff', dest='callgrind_diff',type=int,default=0,help='With --callgrind, print the N functions with the largest instruction count change for every test that regressed on a comparison VM')
+argumentParser.add_argument('--callgrind-diff-threshold', dest='callgrind_diff_threshold',type=float,default=0.5,help='Slowdown percentage after which a test is considered regressed for --callgrind-diff (0.5 by default)')
+argumentParser.add_argument('--server', dest='server',action='store_true',help='Keep one VM process per VM and core running in server mode and send it test paths, instead of starting a new process for every test')
+argumentParser.add_argument('--compile', dest='compile',type=str,nargs='+',choices=['null', 'binary', 'codegennull'],default=None,help='Measure parse and compile throughput of the given luau --compile modes over all sources in --folder instead of running the tests')
+argumentParser.add_argument('--compile-loops', dest='compile_loops',type=int,default=10,help='Amount of times the source corpus is compiled in each loop of --compile (10 by default)')
+argumentParser.add_argument('--metrics', dest='metrics',action='store_true',help='Print every metric reported by the tests and the VM process in the METRICS table; by default only metrics that changed significantly between VMs are printed')
 argumentParser.add_argument('--show-commands', dest='show_commands',action='store_const',const=1,default=0,help='Show the command line used to launch the VM and tests')
 
 if matplotlib != None:
@@ -45,9 +91,24 @@ if matplotlib != None:
     argumentParser.add_argument('--speedup', dest='speedup',action='store_const',const=1,default=0,help='Draw a speedup graph')
     argumentParser.add_argument('--sort', dest='sort',action='store_const',const=1,default=0,help='Sort values from worst to best improvements, ignoring conf. int. (disabled by default)')
     argumentParser.add_argument('--window', dest='window',action='store_const',const=1,default=0,help='Display window with resulting plot (disabled by default)')
+    argumentParser.add_argument('--plot-iterations', dest='plot_iterations',action='store_true',help='Draw the time of every iteration of every test in execution order, with the end of the detected warm-up, into a separate graph')
     argumentParser.add_argument('--graph-vertical', action='store_true',dest='graph_vertical', help="Draw graph with vertical bars instead of horizontal")
 
-argumentParser.add_argument('--report-metrics', dest='report_metrics', help="Send metrics about this session to InfluxDB URL upon completion.")
+argumentParser.add_argument('--db', dest='db',type=str,default=None,help='SQLite database file to append results to, and to read history from for --db-query')
+argumentParser.add_argument('--db-query', dest='db_query',type=str,default=None,help='Print the most recent results of a test (file or test name, wildcards are allowed) from --db instead of running benchmarks')
+argumentParser.add_argument('--db-limit', dest='db_limit',type=int,default=50,help='Amount of results to print for --db-query (50 by default)')
+argumentParser.add_argument('--db-host', dest='db_host',nargs='?',const=socket.gethostname(),default=None,help='Only print --db-query results from this host (current host if no name is given)')
+
+argumentParser.add_argument('--gate', dest='gate',type=str,default=None,help='Results JSON file to use as a baseline; exit with a non-zero code if a test is significantly slower than in the baseline')
+argumentParser.add_argument('--gate-threshold', dest='gate_threshold',type=str,action='append',default=None,help='Slowdown percentage allowed by --gate (2 by default); use PATTERN=PERCENT to set it for a test name, file name or path wildcard, or for a folder name ending with /; the last matching rule wins')
+argumentParser.add_argument('--gate-geomean', dest='gate_geomean',type=lambda value: float(value.rstrip('%')),default=None,help='Geometric mean slowdown percentage over all tests allowed by --gate')
+argumentParser.add_argument('--gate-confirm-loops', dest='gate_confirm_loops',type=int,default=5,help='Amount of extra loops to run for tests flagged by --gate before failing (5 by default)')
+
+argumentParser.add_argument('--report-metrics', dest='report_metrics', help="Send metrics about this session to InfluxDB URL while tests are running, or append them to a file:// URL.")
+argumentParser.add_argument('--report-distribution', dest='report_distribution', action='store_true', help="Also report percentiles, sample count, MAD and a log-bucketed histogram of the samples of every test to InfluxDB.")
+argumentParser.add_argument('--report-batch-size', dest='report_batch_size', type=int, default=500, help="Amount of lines sent to InfluxDB in one compressed request (500 by default).")
+argumentParser.add_argument('--report-retries', dest='report_retries', type=int, default=3, help="Amount of times to retry a failed request to InfluxDB before spooling it (3 by default).")
+argumentParser.add_argument('--report-spool', dest='report_spool', type=str, default=None, help="File to keep metrics that couldn't be sent to InfluxDB in; they are sent by the next run (a file in ~/.cache/luau-bench by default).")
 
 argumentParser.add_argument('--print-influx-debugging', action='store_true', dest='print_influx_debugging', help="Print output to aid in debugging of influx metrics reporting.")
 argumentParser.add_argument('--no-print-influx-debugging', action='store_false', dest='print_influx_debugging', help="Don't print output to aid in debugging of influx metrics reporting.")
@@ -73,18 +134,99 @@ def arrayRangeOffset(count, offset):
 
     return result
 
-def getCallgrindOutput(lines):
+# Per-function costs of callgrind dumps, referenced by id from the test output until they are attached to a TestResult
+callgrindProfiles = {}
+callgrindProfileIds = itertools.count()
+
+def getCallgrindName(names, text):
+    # Names can be compressed: '(id) name' defines an id, '(id)' refers to a previously defined one
+    text = text.strip()
+
+    if text.startswith("("):
+        end = text.find(")")
+        id = text[1:end]
+        name = text[end+1:].strip()
+
+        if name != "":
+            names[id] = name
+
+        return names.get(id, text)
+
+    return text
+
+def getCallgrindOutput(lines, collectFunctions=False):
     result = []
     name = None
+    insn = None
+
+    # Compressed names are shared between all parts of the file
+    names = {}
+
+    positionCount = 1
+    irIndex = 0
+
+    function = None
+    callCost = False
+    exclusive = {}
+    inclusive = {}
+
+    # The summary is in the header of each dump, while function costs follow it, so a test is reported once its dump ends
+    def finishDump():
+        # Note: we only run each bench once under callgrind so we only report a single time per run; callgrind instruction count variance is ~0.01% so it might as well be zero
+        result.append("|><|" + name + "|><|" + str(insn / CALLGRIND_INSN_PER_SEC * 1000.0))
+
+        if collectFunctions:
+            id = next(callgrindProfileIds)
+            callgrindProfiles[id] = { fn: (exclusive[fn], inclusive[fn]) for fn in exclusive }
+            result.append("|><|profile=" + str(id))
+
+        result.append("||_||")
 
     for l in lines:
-        if l.startswith("desc: Trigger: Client Request: "):
-            name = l[31:].strip()
-        elif l.startswith("summary: ") and name != None:
-            insn = int(l[9:])
-            # Note: we only run each bench once under callgrind so we only report a single time per run; callgrind instruction count variance is ~0.01% so it might as well be zero
-            result += "|><|" + name + "|><|" + str(insn / CALLGRIND_INSN_PER_SEC * 1000.0) + "||_||"
-            name = None
+        if l.startswith("desc: Trigger: ") or l.startswith("totals: "):
+            if insn != None:
+                finishDump()
+                insn = None
+
+            name = l[31:].strip() if l.startswith("desc: Trigger: Client Request: ") else None
+
+            function = None
+            exclusive = {}
+            inclusive = {}
+        elif l.startswith("summary: "):
+            if name != None:
+                insn = int(l[9:])
+        elif not collectFunctions:
+            continue
+        elif l.startswith("positions:"):
+            positionCount = len(l.split()) - 1
+        elif l.startswith("events:"):
+            events = l.split()[1:]
+            irIndex = events.index("Ir") if "Ir" in events else 0
+        elif l.startswith("fn="):
+            function = getCallgrindName(names, l[3:])
+
+            if function not in exclusive:
+                exclusive[function] = 0
+                inclusive[function] = 0
+        elif l.startswith("cfn="):
+            getCallgrindName(names, l[4:])
+        elif l.startswith("calls="):
+            # The next cost line is the inclusive cost of the call
+            callCost = True
+        elif function != None and l[0:1] != "" and l[0:1] in "0123456789+-*":
+            tokens = l.split()
+            ir = int(tokens[positionCount + irIndex]) if len(tokens) > positionCount + irIndex else 0
+
+            if callCost:
+                inclusive[function] += ir
+                callCost = False
+            else:
+                exclusive[function] += ir
+                inclusive[function] += ir
+
+    if insn != None:
+        finishDump()
 
     return "".join(result)
 
@@ -92,10 +234,10 @@ def conditionallyShowCommand(cmd):
     if arguments.show_commands:
         print(f'{colored(Color.BLUE, "EXECUTING")}: {cmd}')
 
-def getVmOutput(cmd):
+def getVmOutput(cmd, core=0):
     if os.name == "nt":
         try:
-            fullCmd = "start /realtime /affinity 1 /b /wait cmd /C \"" + cmd + "\""
+            fullCmd = "start /realtime /affinity " + "{:x}".format(1 << core) + " /b /wait cmd /C \"" + cmd + "\""
             conditionallyShowCommand(fullCmd)
             return subprocess.check_output(fullCmd, shell=True, cwd=scriptdir).decode()
         except KeyboardInterrupt:
@@ -103,31 +245,547 @@ def getVmOutput(cmd):
         except:
             return ""
     elif arguments.callgrind:
+        # Every job writes to its own output file so that callgrind runs can overlap
+        fd, path = tempfile.mkstemp(prefix="callgrind-", suffix=".out", dir=scriptdir)
+        os.close(fd)
+
         try:
-            fullCmd = "valgrind --tool=callgrind --callgrind-out-file=callgrind.out --combine-dumps=yes --dump-line=no " + cmd
+            fullCmd = "valgrind --tool=callgrind --callgrind-out-file=" + path + " --combine-dumps=yes --dump-line=no " + cmd
             conditionallyShowCommand(fullCmd)
             subprocess.check_call(fullCmd, shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=scriptdir)
-            path = os.path.join(scriptdir, "callgrind.out")
             with open(path, "r") as file:
-                lines = file.readlines()
-            os.unlink(path)
-            return getCallgrindOutput(lines)
+                return getCallgrindOutput(file, arguments.callgrind_diff > 0)
         except:
             return ""
+        finally:
+            os.unlink(path)
+    elif arguments.perf_stat:
+        fd, path = tempfile.mkstemp(prefix="perf-", suffix=".csv")
+        os.close(fd)
+
+        try:
+            output = runPinnedProcess("perf stat -x, -o " + path + " -e " + arguments.perf_events + " " + cmd, core)
+            return appendRecordFields(output, getPerfStatOutput(path))
+        finally:
+            os.unlink(path)
     else:
+        return runPinnedProcess(cmd, core)
+
+def startPinnedProcess(core, *args, **kwargs):
+    if sys.platform == "darwin" or os.name == "nt":
+        return subprocess.Popen(*args, **kwargs)
+
+    # Processes inherit the affinity of the thread that starts them, so they run on their core from the first instruction
+    previous = os.sched_getaffinity(0)
+    os.sched_setaffinity(0, { core })
+
+    try:
+        return subprocess.Popen(*args, **kwargs)
+    finally:
+        os.sched_setaffinity(0, previous)
+
+def runPinnedProcess(cmd, core):
+    conditionallyShowCommand(cmd)
+    with startPinnedProcess(core, cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, cwd=scriptdir) as p:
+        # Try to set high priority (requires sudo)
+        try:
+            os.nice(-10)
+        except:
+            pass
+
+        output = p.stdout.read()
+
+        # Reap the process ourselves to get its resource usage, which includes the VM started by the shell
+        pid, status, usage = os.wait4(p.pid, 0)
+        p.returncode = os.waitstatus_to_exitcode(status)
+
+        return appendRecordFields(output, getResourceUsage(usage))
+
+def getPerfStatOutput(path):
+    counters = {}
+
+    try:
+        with open(path, "r") as file:
+            for line in file:
+                # CSV output: value,unit,event,run time,percentage of run time counted,...
+                fields = line.strip().split(",")
+
+                if line.startswith("#") or len(fields) < 3:
+                    continue
+
+                try:
+                    value = float(fields[0])
+                except ValueError:
+                    # <not counted> or <not supported>
+                    continue
+
+                # Drop modifiers such as ':u'
+                counters[fields[2].split(":")[0]] = value
+    except OSError:
+        return counters
+
+    if counters.get('instructions') and counters.get('cycles'):
+        counters['ipc'] = counters['instructions'] / counters['cycles']
+
+    return counters
+
+def appendRecordFields(output, fields):
+    # Process-wide values are attached to every test result reported by the process
+    suffix = "".join("|><|" + key + "=" + repr(value) for key, value in fields.items())
+
+    return output.replace("||_||", suffix + "||_||")
+
+def getCompileStats(output):
+    for line in output.splitlines():
+        if line.startswith("Compile stats: "):
+            return { key: float(value) for key, value in (field.split("=") for field in line[15:].split()) }
+
+    return None
+
+def getCompileOutput(vm, mode, files, core):
+    # Mode has to be the first argument of the VM
+    executable, vmArguments = getVmExecutable(vm)
+    cmd = substituteArguments(executable + " --compile=" + mode + " --compile-stats " + vmArguments, "") + " " + " ".join(files)
+
+    times = []
+    fields = {}
+
+    for i in range(arguments.compile_loops):
         conditionallyShowCommand(cmd)
-        with subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, cwd=scriptdir) as p:
-            # Try to lock to a single processor
-            if sys.platform != "darwin":
-                os.sched_setaffinity(p.pid, { 0 })
 
-            # Try to set high priority (requires sudo)
+        # Bytecode is discarded, stats are printed to stderr; files that fail to compile are reported there too but are not counted
+        with startPinnedProcess(core, cmd, shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, cwd=scriptdir) as p:
+            compileStats = getCompileStats(p.communicate()[1])
+
+        if compileStats == None:
+            continue
+
+        seconds = compileStats['parse'] + compileStats['compile'] + compileStats['codegentime']
+
+        if seconds <= 0:
+            continue
+
+        times.append(seconds * 1000)
+        fields.setdefault('MB/s', []).append(compileStats['source'] / 1e6 / seconds)
+        fields.setdefault('functions/s', []).append(compileStats['functions'] / seconds)
+        fields.setdefault('parse', []).append(compileStats['parse'] * 1000)
+        fields.setdefault('compile', []).append(compileStats['compile'] * 1000)
+
+        if mode == 'codegennull':
+            fields.setdefault('codegen', []).append(compileStats['codegentime'] * 1000)
+
+    if len(times) == 0:
+        return ""
+
+    # Same record format as bench_support, so that results go through the regular statistics and comparison tables
+    return "|><|compile=" + mode + "".join("|><|" + repr(value) for value in times) + "".join("|><|" + key + "=" + ",".join(repr(value) for value in values) for key, values in fields.items()) + "||_||"
+
+def getVmExecutable(vm):
+    # Hope that the path to executable doesn't contain spaces
+    argumentPos = vm.find(" ")
+
+    if argumentPos != -1:
+        return vm[0:argumentPos], vm[argumentPos+1:].strip()
+
+    return vm, ""
+
+fileHashCache = {}
+
+def getFileHash(path):
+    if path not in fileHashCache:
+        try:
+            with open(path, "rb") as f:
+                fileHashCache[path] = hashlib.sha256(f.read()).hexdigest()
+        except:
+            fileHashCache[path] = ""
+
+    return fileHashCache[path]
+
+gitCommitCache = {}
+
+def getGitCommit(path):
+    folder = os.path.dirname(os.path.abspath(path))
+
+    if folder not in gitCommitCache:
+        try:
+            gitCommitCache[folder] = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=folder, stderr=subprocess.DEVNULL, text=True).strip()
+        except:
+            gitCommitCache[folder] = ""
+
+    return gitCommitCache[folder]
+
+def getSmtSiblings(core):
+    try:
+        with open(f"/sys/devices/system/cpu/cpu{core}/topology/thread_siblings_list") as f:
+            return parseCpuList(f.read())
+    except:
+        return [core]
+
+def readSystemFile(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def getCpuTimes():
+    # Busy and total jiffies of every core from /proc/stat
+    times = {}
+
+    try:
+        with open("/proc/stat") as f:
+            for line in f:
+                fields = line.split()
+
+                if fields[0].startswith("cpu") and fields[0] != "cpu":
+                    values = [int(value) for value in fields[1:]]
+                    idle = values[3] + (values[4] if len(values) > 4 else 0)
+                    times[int(fields[0][3:])] = (sum(values) - idle, sum(values))
+    except OSError:
+        pass
+
+    return times
+
+def getThrottleCounts(cores):
+    counts = {}
+
+    for core in cores:
+        for counter in ["core_throttle_count", "package_throttle_count"]:
+            value = readSystemFile(f"/sys/devices/system/cpu/cpu{core}/thermal_throttle/{counter}")
+
+            if value != None:
+                counts[f"cpu{core}/{counter}"] = int(value)
+
+    return counts
+
+noiseCalibrationScript = """
+local bench = require("bench_support")
+local samples = {}
+local deadline = os.clock() + %f
+
+while os.clock() < deadline or #samples < 10 do
+    local ts0 = os.clock()
+    local sum = 0
+    for i = 1, 100000 do
+        sum = sum + i %% 7
+    end
+    table.insert(samples, os.clock() - ts0)
+end
+
+print(bench.runs)
+print(table.concat(samples, ","))
+"""
+
+def measureNoiseFloor(vm, core, duration):
+    # Times a fixed amount of work in the VM on the benchmark core; its variation is the noise that every measurement will have
+    fd, path = tempfile.mkstemp(prefix="calibrate-", suffix=".lua")
+
+    with os.fdopen(fd, "w") as f:
+        f.write(noiseCalibrationScript % duration)
+
+    try:
+        executable, vmArguments = getVmExecutable(vm)
+        output = runPinnedProcess(executable + " " + path, core)
+    finally:
+        os.unlink(path)
+
+    try:
+        runs, samples = output.strip().split("\n")[-2:]
+        runs = int(runs)
+        samples = sorted(float(value) for value in samples.split(","))
+    except ValueError:
+        return None, None
+
+    # Median absolute deviation scaled to a standard deviation, since the slowest runs of each test are discarded as well
+    median = samples[len(samples) // 2]
+    deviations = sorted(abs(sample - median) for sample in samples)
+
+    return (1.4826 * deviations[len(deviations) // 2] / median * 100 if median > 0 else None), runs
+
+def runPreflight(vm, cores):
+    environment = {
+        'cores': cores,
+        'governor': {},
+        'boost': readSystemFile("/sys/devices/system/cpu/cpufreq/boost"),
+        'noTurbo': readSystemFile("/sys/devices/system/cpu/intel_pstate/no_turbo"),
+        'isolated': readSystemFile("/sys/devices/system/cpu/isolated"),
+        'nohzFull': readSystemFile("/sys/devices/system/cpu/nohz_full"),
+        'loadAverage': list(os.getloadavg()),
+        'throttle': getThrottleCounts(cores),
+        'busy': {},
+        'noise': {}
+    }
+
+    warnings = []
+
+    for core in cores:
+        governor = readSystemFile(f"/sys/devices/system/cpu/cpu{core}/cpufreq/scaling_governor")
+        environment['governor'][core] = governor
+
+        if governor != None and governor != "performance":
+            warnings.append(f"core {core} uses the '{governor}' cpufreq governor instead of 'performance'")
+
+    if environment['boost'] == "1" or environment['noTurbo'] == "0":
+        warnings.append("turbo boost is enabled, clock speed will depend on temperature and load of other cores")
+
+    isolated = parseCpuList(environment['isolated']) if environment['isolated'] else []
+    nohzFull = parseCpuList(environment['nohzFull']) if environment['nohzFull'] and environment['nohzFull'] != "(null)" else []
+
+    if any(core not in isolated for core in cores):
+        warnings.append("benchmark cores are not isolated with isolcpus, other processes can be scheduled on them")
+    elif any(core not in nohzFull for core in cores):
+        warnings.append("benchmark cores are isolated but don't have nohz_full, timer interrupts will still run on them")
+
+    if environment['loadAverage'][0] > max((os.cpu_count() or 1) - len(cores), 1):
+        warnings.append("load average of {:.2f} leaves no idle cores for the benchmarks".format(environment['loadAverage'][0]))
+
+    # Other tenants on benchmark cores or their SMT siblings are found by watching them while we are idle
+    before = getCpuTimes()
+    time.sleep(0.2)
+    after = getCpuTimes()
+
+    for core in cores:
+        for sibling in getSmtSiblings(core):
+            if sibling not in before or sibling not in after or after[sibling][1] == before[sibling][1]:
+                continue
+
+            busy = (after[sibling][0] - before[sibling][0]) / (after[sibling][1] - before[sibling][1])
+            environment['busy'][sibling] = busy
+
+            if busy <= 0.1:
+                continue
+
+            if sibling == core:
+                warnings.append("benchmark core {} is {:.0f}% busy with other processes".format(core, busy * 100))
+            else:
+                warnings.append("SMT sibling {} of benchmark core {} is {:.0f}% busy".format(sibling, core, busy * 100))
+
+    runs = 1
+
+    for core in cores:
+        noise, coreRuns = measureNoiseFloor(vm, core, arguments.calibration_time / len(cores))
+
+        if noise != None:
+            environment['noise'][core] = noise
+            runs = coreRuns
+
+    # Each test reports 'bench.runs' samples per loop, so this is the confidence interval that noise alone will cause
+    samples = runs * (arguments.extra_loops + 1)
+    tValue = stats.t.ppf(1 - 0.05 / 2, samples - 1) if stats and samples > 1 else 2
+    threshold = arguments.target_ci if arguments.target_ci != None else arguments.noise_threshold
+
+    noisy = False
+
+    for core, noise in environment['noise'].items():
+        expected = noise * tValue / math.sqrt(samples)
+
+        if expected > threshold:
+            noisy = True
+            warnings.append("noise floor of core {} is {:.2f}%, expected confidence interval of {:.2f}% is above the {:.2f}% threshold".format(core, noise, expected, threshold))
+
+    environment['warnings'] = warnings
+
+    for warning in warnings:
+        print(colored(Color.YELLOW, 'WARNING') + ": " + warning)
+
+    # Other problems are reported, but only the measured noise decides whether results can be trusted
+    if noisy and arguments.preflight == 'strict':
+        print(colored(Color.RED, 'FAILED') + ": the machine is too noisy for benchmarking, use --preflight warn to run anyway")
+        exit(1)
+
+    return environment
+
+def checkThrottling(environment):
+    throttle = getThrottleCounts(environment['cores'])
+
+    for counter, count in throttle.items():
+        if count > environment['throttle'].get(counter, count):
+            print(colored(Color.YELLOW, 'WARNING') + ": CPU was thermally throttled during the run ({} increased by {})".format(counter, count - environment['throttle'][counter]))
+
+    environment['throttled'] = { counter: count - environment['throttle'].get(counter, count) for counter, count in throttle.items() }
+
+def getBenchmarkCores():
+    if arguments.cores:
+        return parseCpuList(arguments.cores)
+
+    if hasattr(os, "sched_getaffinity"):
+        available = sorted(os.sched_getaffinity(0))
+    else:
+        available = list(range(os.cpu_count() or 1))
+
+    if arguments.no_smt:
+        # Keep the first hardware thread of each physical core so that parallel jobs don't compete for execution units
+        available = [core for core in available if min(getSmtSiblings(core)) == core]
+
+    if arguments.jobs != None:
+        jobs = max(arguments.jobs, 1)
+    elif arguments.callgrind:
+        # Callgrind instruction counts don't depend on other load on the machine, so all cores can be used
+        jobs = len(available)
+    else:
+        jobs = 1
+
+    if jobs > len(available):
+        print(f"Warning: only {len(available)} cores are available, running {len(available)} jobs instead of {jobs}")
+        jobs = len(available)
+
+    if jobs == 1:
+        # Keep the historical behavior of locking single-threaded runs to the first core
+        return [0]
+
+    return available[:jobs]
+
+# Must match the marker printed by 'luau --server' after each script
+serverDoneMarker = "--luau-server-done"
+
+class VmServer:
+    def __init__(self, vm, core):
+        executable, vmArguments = getVmExecutable(vm)
+        cmd = substituteArguments(executable + " --server " + vmArguments, "")
+
+        conditionallyShowCommand(cmd)
+        self.process = startPinnedProcess(core, cmd, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, cwd=scriptdir)
+
+    def run(self, filepath):
+        # Returns None if the server has crashed
+        try:
+            self.process.stdin.write(filepath + "\n")
+            self.process.stdin.flush()
+        except OSError:
+            return None
+
+        output = []
+
+        while True:
+            line = self.process.stdout.readline()
+
+            if line == "":
+                return None
+
+            if line.startswith(serverDoneMarker):
+                return "".join(output)
+
+            output.append(line)
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=10)
+        except:
+            self.process.kill()
+
+class CorePool:
+    # Work with a lower priority value runs first, in submission order otherwise
+    PRIORITY_NORMAL = 1
+    PRIORITY_URGENT = 0
+
+    def __init__(self, cores):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.servers = []
+        self.serverCrashes = set()
+        self.queue = queue.PriorityQueue()
+        self.sequence = itertools.count()
+
+        # Each worker thread owns a dedicated core for its whole lifetime
+        self.workers = [threading.Thread(target=self._work, args=(core,), daemon=True) for core in cores]
+
+        for worker in self.workers:
+            worker.start()
+
+    def _work(self, core):
+        self.local.core = core
+        self.local.servers = {}
+
+        while True:
+            priority, sequence, future, fn, args = self.queue.get()
+
+            if future == None:
+                return
+
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            # Lets callers measure the time spent running instead of waiting in the queue
+            future.startTime = time.monotonic()
+
             try:
-                os.nice(-10)
-            except:
-                pass
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def _submit(self, priority, fn, *args):
+        future = Future()
+        self.queue.put((priority, next(self.sequence), future, fn, args))
+        return future
+
+    def _runOnServer(self, vm, filepath):
+        server = self.local.servers.get(vm)
+
+        if server == None:
+            server = VmServer(vm, self.local.core)
+            self.local.servers[vm] = server
+
+            with self.lock:
+                self.servers.append(server)
+
+        output = server.run(filepath)
+
+        if output == None:
+            # A new server will be started for the next test
+            server.close()
+            del self.local.servers[vm]
+
+            with self.lock:
+                self.serverCrashes.add((vm, filepath))
+
+        return output
+
+    def _run(self, vm, filepath):
+        extra = getExtraArguments(filepath)
 
-            return p.communicate()[0]
+        if arguments.gc_stats:
+            vm += " --gc-stats"
+
+        # Servers are started with fixed arguments, so tests with their own VM arguments need a separate process
+        if arguments.server and extra == "" and (vm, filepath) not in self.serverCrashes:
+            output = self._runOnServer(vm, filepath)
+
+            if output != None:
+                return output
+
+        return getVmOutput(substituteArguments(vm, extra) + " " + filepath, self.local.core)
+
+    def _runCompile(self, vm, mode, files):
+        return getCompileOutput(vm, mode, files, self.local.core)
+
+    def submit(self, vm, filepath, priority=PRIORITY_NORMAL):
+        return self._submit(priority, self._run, vm, filepath)
+
+    def submitCompile(self, vm, mode, files, priority=PRIORITY_NORMAL):
+        return self._submit(priority, self._runCompile, vm, mode, files)
+
+    def shutdown(self, cancel=False):
+        if cancel:
+            while True:
+                try:
+                    priority, sequence, future, fn, args = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+
+                if future != None:
+                    future.cancel()
+
+        # Sentinels go after all remaining work
+        for worker in self.workers:
+            self.queue.put((math.inf, next(self.sequence), None, None, None))
+
+        if not cancel:
+            for worker in self.workers:
+                worker.join()
+
+        for server in self.servers:
+            server.close()
 
 def getShortVmName(name):
     # Hope that the path to executable doesn't contain spaces
@@ -157,23 +815,7 @@ def getShortVmName(name):
 
     return name
 
-class TestResult:
-    filename = ""
-    vm = ""
-    shortVm = ""
-    name = ""
-
-    values = []
-    count = 0
-    min = None
-    avg = 0
-    max = None
-
-    sampleStdDev = 0
-    unbiasedEst = 0
-    sampleConfidenceInterval = 0
-
-def extractResult(filename, vm, output):
+def extractResult(filename, vm, output, round):
     elements = output.split("|><|")
 
     # Remove test output
@@ -189,71 +831,70 @@ def extractResult(filename, vm, output):
     elements.remove(elements[0])
 
     timeTable = []
+    fields = {}
 
     for el in elements:
-        timeTable.append(float(el))
+        # Extra data is reported as 'key=value,value,...' after the samples
+        pos = el.find("=")
+
+        if pos != -1:
+            fields[el[0:pos]] = [float(v) for v in el[pos+1:].split(",") if v != ""]
+        else:
+            timeTable.append(float(el))
 
     result.values = timeTable
-    result.count = len(timeTable)
+    result.outliers = fields.pop("outliers", [])
 
-    return result
+    if "profile" in fields:
+        result.functionCosts = callgrindProfiles.pop(int(fields.pop("profile")[0]), None)
 
-def mergeResult(lhs, rhs):
-    for value in rhs.values:
-        lhs.values.append(value)
+    result.timelines = []
 
-    lhs.count = len(lhs.values)
+    if "order" in fields:
+        order = fields.pop("order")
+        result.timelines.append({ 'order': order, 'clock': fields.pop("clock", []) })
 
-def mergeResults(lhs, rhs):
-    for a, b in zip(lhs, rhs):
-        mergeResult(a, b)
+        warmupRuns, warmupCost, steadyState = getWarmup(order)
 
-def finalizeResult(result):
-    total = 0.0
+        fields['warmup_runs'] = [warmupRuns]
+        fields['warmup_ms'] = [warmupCost]
+        fields['steady_ms'] = [steadyState]
 
-    # Compute basic parameters
-    for v in result.values:
-        if result.min == None or v < result.min:
-            result.min = v
+    result.metrics = fields
+    result.rounds = [round] * len(timeTable)
+    result.count = len(timeTable)
 
-        if result.max == None or v > result.max:
-            result.max = v
+    return result
 
-        total = total + v
+def getWarmup(order):
+    # Warm-up is the series of segments at the start that are slower than the rest by more than the noise
+    # The steady state has to cover at least half of the runs, otherwise a slow tail would count as the steady state
+    noise = estimate_noise(order)
+    bounds = [0] + find_changepoints(order, min_size=1, sigma=noise) + [len(order)]
+    warmupEnd = 0
 
-    if result.count > 0:
-        result.avg = total / result.count
-    else:
-        result.avg = 0
+    for start, end in zip(bounds, bounds[1:-1]):
+        if end > len(order) // 2:
+            break
 
-    # Compute standard deviation
-    sumOfSquares = 0
+        rest = sorted(order[end:])
 
-    for v in result.values:
-        sumOfSquares = sumOfSquares + (v - result.avg) ** 2
+        if sum(order[start:end]) / (end - start) - rest[len(rest) // 2] <= noise:
+            break
 
-    if result.count > 1:
-        result.sampleStdDev = math.sqrt(sumOfSquares / (result.count - 1))
-        result.unbiasedEst = result.sampleStdDev * result.sampleStdDev
+        warmupEnd = end
 
-        if stats:
-            # Two-tailed distribution with 95% conf.
-            tValue = stats.t.ppf(1 - 0.05 / 2, result.count - 1)
+    steady = sorted(order[warmupEnd:])
+    steadyState = steady[len(steady) // 2]
 
-            # Compute confidence interval
-            result.sampleConfidenceInterval = tValue * result.sampleStdDev / math.sqrt(result.count)
-        else:
-            result.sampleConfidenceInterval = result.sampleStdDev
-    else:
-        result.sampleStdDev = 0
-        result.unbiasedEst = 0
-        result.sampleConfidenceInterval = 0
-
-    return result
+    return warmupEnd, sum(order[:warmupEnd]) - warmupEnd * steadyState, steadyState
 
 # Full result set
 allResults = []
 
+# Machine state recorded by preflight checks
+benchEnvironment = None
+
 
 # Data for the graph
 plotLegend = []
@@ -263,11 +904,14 @@ plotLabels = []
 plotValueLists = []
 plotConfIntLists = []
 
-# Totals
+# Totals, only over the tests that have results on every VM so that they compare the same work
 vmTotalMin = []
 vmTotalAverage = []
+vmTotalExcluded = 0
 vmTotalImprovement = []
 vmTotalResults = []
+vmTotalDrift = []
+vmTotalDriftResults = []
 
 # Data for Telegraf report
 mainTotalMin = 0
@@ -297,7 +941,7 @@ def substituteArguments(cmd, extra):
 
     return cmd
 
-def extractResults(filename, vm, output, allowFailure):
+def extractResults(filename, vm, output, allowFailure, round=0):
     results = []
 
     splitOutput = output.split("||_||")
@@ -317,13 +961,248 @@ def extractResults(filename, vm, output, allowFailure):
     splitOutput.remove(splitOutput[len(splitOutput) - 1])
 
     for el in splitOutput:
-        results.append(extractResult(filename, vm, el))
+        results.append(extractResult(filename, vm, el, round))
 
     return results
 
+def getRoundDrift(result):
+    rounds = sorted(set(result.rounds))
+
+    if len(rounds) < 2:
+        return None
+
+    # Compare samples from the first half of the rounds against samples from the second half
+    lateStart = rounds[len(rounds) // 2]
+
+    early = [value for value, round in zip(result.values, result.rounds) if round < lateStart]
+    late = [value for value, round in zip(result.values, result.rounds) if round >= lateStart]
+
+    if len(early) == 0 or len(late) == 0 or sum(early) == 0:
+        return None
+
+    return (sum(late) / len(late)) / (sum(early) / len(early)) - 1
+
+def accumulateDrift(index, result):
+    drift = getRoundDrift(result)
+
+    if drift != None and drift > -1:
+        vmTotalDrift[index] += math.log(1 + drift)
+        vmTotalDriftResults[index] += 1
+
+def finalizeRobustStats(result):
+    samples = numpy.array(result.values + result.outliers)
+
+    if len(samples) == 0:
+        return
+
+    result.p50, result.p90, result.p99 = numpy.percentile(samples, [50, 90, 99])
+    result.mad = numpy.median(numpy.abs(samples - result.p50))
+
+def getBootstrapMedianSpeedup(main, compare, resamples=2000):
+    mainSamples = numpy.array(main.values + main.outliers)
+    compareSamples = numpy.array(compare.values + compare.outliers)
+
+    if len(mainSamples) == 0 or len(compareSamples) == 0:
+        return None
+
+    rng = numpy.random.default_rng(arguments.seed)
+    ratios = []
+
+    # Resample in chunks to bound the memory used by the index matrices on large result sets
+    chunk = max(1, min(resamples, 4000000 // max(len(mainSamples), len(compareSamples))))
+
+    for start in range(0, resamples, chunk):
+        count = min(chunk, resamples - start)
+
+        mainMedians = numpy.median(mainSamples[rng.integers(0, len(mainSamples), size=(count, len(mainSamples)))], axis=1)
+        compareMedians = numpy.median(compareSamples[rng.integers(0, len(compareSamples), size=(count, len(compareSamples)))], axis=1)
+
+        ratios.append(mainMedians / compareMedians - 1)
+
+    low, high = numpy.percentile(numpy.concatenate(ratios), [2.5, 97.5])
+    return low, high
+
+def getMannWhitneyVerdict(main, compare):
+    mainSamples = main.values + main.outliers
+    compareSamples = compare.values + compare.outliers
+
+    if not stats or len(mainSamples) == 0 or len(compareSamples) == 0:
+        return "", -1
+
+    pValue = stats.mannwhitneyu(mainSamples, compareSamples, alternative='two-sided').pvalue
+
+    if pValue >= 0.05:
+        return "likely same", pValue
+    elif numpy.median(mainSamples) < numpy.median(compareSamples):
+        return "likely worse", pValue
+    else:
+        return "likely better", pValue
+
+def getMemoryColumns(result):
+    columns = {}
+
+    if len(result.metrics.get('maxrss', [])) != 0:
+        columns['Peak RSS'] = '{:8.1f}MB'.format(sum(result.metrics['maxrss']) / len(result.metrics['maxrss']) / 1024)
+
+    if len(result.metrics.get('heap_after', [])) != 0:
+        columns['Heap'] = '{:8.1f}KB'.format(sum(result.metrics['heap_after']) / len(result.metrics['heap_after']))
+
+    return columns
+
+def getRobustColumns(result):
+    if not arguments.robust_stats:
+        return {}
+
+    finalizeRobustStats(result)
+
+    if result.p50 == None:
+        return {}
+
+    return {
+        'P50': '{:8.3f}ms'.format(result.p50),
+        'P90': '{:8.3f}ms'.format(result.p90),
+        'P99': '{:8.3f}ms'.format(result.p99),
+        'MAD%': '{:8.3f}%'.format(result.mad / result.p50 * 100) if result.p50 > 0 else "---"
+    }
+
+def getRobustComparisonColumns(main, compare):
+    if not arguments.robust_stats:
+        return {}
+
+    speedupInterval = getBootstrapMedianSpeedup(main, compare)
+    verdict, pValue = getMannWhitneyVerdict(main, compare)
+
+    return {
+        'Median speedup CI': '' if speedupInterval == None else '[{:+.3f}%, {:+.3f}%]'.format(speedupInterval[0] * 100, speedupInterval[1] * 100),
+        'U-test': verdict,
+        'P(U)': '---' if pValue < 0 else '{:.0f}%'.format(pValue * 100)
+    }
+
+# Metrics where a larger value is an improvement
+higherIsBetterMetrics = { 'ipc', 'MB/s', 'functions/s' }
+
+def getMetricResult(result, metric):
+    metricResult = TestResult()
+
+    metricResult.filename = result.filename
+    metricResult.vm = result.vm
+    metricResult.shortVm = result.shortVm
+    metricResult.name = result.name
+    metricResult.values = result.metrics.get(metric, [])
+    metricResult.count = len(metricResult.values)
+
+    return finalizeResult(metricResult)
+
+def formatMetric(value):
+    return '{:12.4g}'.format(value)
+
+def analyzeMetrics(main, comparisons):
+    for metric in sorted(main.metrics):
+        mainMetric = getMetricResult(main, metric)
+
+        if mainMetric.count == 0:
+            continue
+
+        rows = [{
+            'Test': main.name,
+            'Metric': metric,
+            'Average': formatMetric(mainMetric.avg),
+            'StdDev%': '{:8.3f}%'.format(mainMetric.sampleConfidenceInterval / mainMetric.avg * 100) if mainMetric.avg != 0 else "---",
+            'Driver': main.shortVm
+        }]
+
+        changed = False
+
+        for compare in comparisons:
+            compareMetric = getMetricResult(compare, metric)
+
+            if compareMetric.count == 0 or compareMetric.avg == 0:
+                continue
+
+            noSignificantDifference, pValue = getSignificance(mainMetric, compareMetric)
+
+            if metric in higherIsBetterMetrics:
+                speedup = compareMetric.avg / mainMetric.avg - 1
+            else:
+                speedup = mainMetric.avg / compareMetric.avg - 1
+
+            if noSignificantDifference is None:
+                verdict = ""
+            elif noSignificantDifference:
+                verdict = "likely same"
+            elif speedup < 0:
+                verdict = "likely worse"
+            else:
+                verdict = "likely better"
+
+            speedupColor = Color.YELLOW if noSignificantDifference or speedup == 0 else Color.RED if speedup < 0 else Color.GREEN
+
+            if noSignificantDifference == False and speedup != 0:
+                changed = True
+
+            rows.append({
+                'Test': main.name,
+                'Metric': metric,
+                'Average': formatMetric(compareMetric.avg),
+                'StdDev%': '{:8.3f}%'.format(compareMetric.sampleConfidenceInterval / compareMetric.avg * 100),
+                'Driver': compare.shortVm,
+                'Speedup': colored(speedupColor, '{:8.3f}%'.format(speedup * 100)),
+                'Significance': verdict,
+                'P(T<=t)': '---' if pValue < 0 else '{:.0f}%'.format(pValue * 100)
+            })
+
+        # Most metrics stay the same between VMs, so unless all of them are requested only the changed ones are shown
+        if changed or arguments.metrics:
+            for row in rows:
+                metricPrinter.add_row(row)
+
+# Function cost tables of regressed tests, printed after the results
+functionDiffs = []
+
+def analyzeFunctionCosts(main, compare, speedup):
+    if main.functionCosts == None or compare.functionCosts == None:
+        return
+
+    deltas = []
+
+    for function in main.functionCosts.keys() | compare.functionCosts.keys():
+        mainExclusive, mainInclusive = main.functionCosts.get(function, (0, 0))
+        compareExclusive, compareInclusive = compare.functionCosts.get(function, (0, 0))
+
+        if mainExclusive != compareExclusive or mainInclusive != compareInclusive:
+            deltas.append((function, mainExclusive, compareExclusive, mainInclusive, compareInclusive))
+
+    totalDelta = sum(el[2] - el[1] for el in deltas)
+
+    # Rank by the change in self cost since inclusive costs count every change once per caller
+    deltas.sort(key=lambda el: -abs(el[2] - el[1]))
+
+    functionPrinter = TablePrinter([
+        {'label': 'Function', 'align': Alignment.LEFT},
+        {'label': 'Self Ir', 'align': Alignment.RIGHT},
+        {'label': 'Self Ir (new)', 'align': Alignment.RIGHT},
+        {'label': 'Self delta', 'align': Alignment.RIGHT},
+        {'label': 'Incl delta', 'align': Alignment.RIGHT},
+        {'label': 'Share', 'align': Alignment.RIGHT}
+    ])
+
+    for function, mainExclusive, compareExclusive, mainInclusive, compareInclusive in deltas[0:arguments.callgrind_diff]:
+        delta = compareExclusive - mainExclusive
+
+        functionPrinter.add_row({
+            'Function': function,
+            'Self Ir': '{:,}'.format(mainExclusive),
+            'Self Ir (new)': '{:,}'.format(compareExclusive),
+            'Self delta': colored(Color.RED if delta > 0 else Color.GREEN if delta < 0 else Color.YELLOW, '{:+,}'.format(delta)),
+            'Incl delta': '{:+,}'.format(compareInclusive - mainInclusive),
+            'Share': '{:.1f}%'.format(delta / totalDelta * 100) if totalDelta != 0 else "---"
+        })
+
+    functionDiffs.append(("'{}': {} vs {} ({:+.3f}%)".format(main.name, main.shortVm, compare.shortVm, speedup * 100), functionPrinter))
+
 def analyzeResult(subdir, main, comparisons):
     # Aggregate statistics
-    global mainTotalMin, mainTotalAverage, mainTotalMax
+    global mainTotalMin, mainTotalAverage, mainTotalMax, vmTotalExcluded
 
     mainTotalMin = mainTotalMin + main.min
     mainTotalAverage = mainTotalAverage + main.avg
@@ -338,7 +1217,9 @@ def analyzeResult(subdir, main, comparisons):
             'Driver': main.shortVm,
             'Speedup': "",
             'Significance': "",
-            'P(T<=t)': ""
+            'P(T<=t)': "",
+            **getMemoryColumns(main),
+            **getRobustColumns(main)
         })
     else:
         resultPrinter.add_row({
@@ -346,11 +1227,15 @@ def analyzeResult(subdir, main, comparisons):
             'Min': '{:8.3f}ms'.format(main.min),
             'Average': '{:8.3f}ms'.format(main.avg),
             'StdDev%': '{:8.3f}%'.format(main.sampleConfidenceInterval / main.avg * 100),
-            'Driver': main.shortVm
+            'Driver': main.shortVm,
+            **getMemoryColumns(main),
+            **getRobustColumns(main)
         })
 
     if influxReporter != None:
-        influxReporter.report_result(subdir, main.name, main.filename, "SUCCESS", main.min, main.avg, main.max, main.sampleConfidenceInterval, main.shortVm, main.vm)
+        influxReporter.report_result(subdir, main.name, main.filename, "SUCCESS", main.min, main.avg, main.max, main.sampleConfidenceInterval, main.shortVm, main.vm, main.values + main.outliers)
+
+    analyzeMetrics(main, comparisons)
 
     print(colored(Color.YELLOW, 'SUCCESS') + ': {:<40}'.format(main.name) + ": " + '{:8.3f}'.format(main.avg) + "ms +/- " +
         '{:6.3f}'.format(main.sampleConfidenceInterval / main.avg * 100) + "% on " + main.shortVm)
@@ -367,6 +1252,8 @@ def analyzeResult(subdir, main, comparisons):
         vmTotalAverage.append(0.0)
         vmTotalImprovement.append(0.0)
         vmTotalResults.append(0)
+        vmTotalDrift.append(0.0)
+        vmTotalDriftResults.append(0)
 
     if arguments.absolute or arguments.speedup:
         scale = 1
@@ -376,8 +1263,15 @@ def analyzeResult(subdir, main, comparisons):
     plotValueLists[index].append(main.avg * scale)
     plotConfIntLists[index].append(main.sampleConfidenceInterval * scale)
 
-    vmTotalMin[index] += main.min
-    vmTotalAverage[index] += main.avg
+    complete = all(compare.min != None for compare in comparisons)
+
+    if complete:
+        vmTotalMin[index] += main.min
+        vmTotalAverage[index] += main.avg
+    else:
+        vmTotalExcluded += 1
+
+    accumulateDrift(index, main)
 
     for compare in comparisons:
         index = index + 1
@@ -390,13 +1284,18 @@ def analyzeResult(subdir, main, comparisons):
             vmTotalAverage.append(0.0)
             vmTotalImprovement.append(0.0)
             vmTotalResults.append(0)
+            vmTotalDrift.append(0.0)
+            vmTotalDriftResults.append(0)
 
         if compare.min == None:
-            print(colored(Color.RED, 'FAILED') + ":  '" + main.name + "' on '" + compare.vm +  "'")
+            # Tests can be missing from some of the result files given to --results, which isn't a failure
+            status = "MISSING" if compare.missing else "FAILED"
+
+            print(colored(Color.RED, status) + ":  '" + main.name + "' on '" + compare.vm +  "'")
 
-            resultPrinter.add_row({ 'Test': main.name, 'Min': "", 'Average': "FAILED", 'StdDev%': "", 'Driver': compare.shortVm, 'Speedup': "", 'Significance': "", 'P(T<=t)': "" })
+            resultPrinter.add_row({ 'Test': main.name, 'Min': "", 'Average': status, 'StdDev%': "", 'Driver': compare.shortVm, 'Speedup': "", 'Significance': "", 'P(T<=t)': "" })
 
-            if influxReporter != None:
+            if influxReporter != None and not compare.missing:
                 influxReporter.report_result(subdir, main.filename, main.filename, "FAILED", 0.0, 0.0, 0.0, 0.0, compare.shortVm, compare.vm)
 
             if arguments.speedup:
@@ -411,20 +1310,7 @@ def analyzeResult(subdir, main, comparisons):
 
             continue
 
-        if main.count > 1 and stats:
-            pooledStdDev = math.sqrt((main.unbiasedEst + compare.unbiasedEst) / 2)
-
-            tStat = abs(main.avg - compare.avg) / (pooledStdDev * math.sqrt(2 / main.count))
-            degreesOfFreedom = 2 * main.count - 2
-
-            # Two-tailed distribution with 95% conf.
-            tCritical = stats.t.ppf(1 - 0.05 / 2, degreesOfFreedom)
-
-            noSignificantDifference = tStat < tCritical
-            pValue = 2 * (1 - stats.t.cdf(tStat, df = degreesOfFreedom))
-        else:
-            noSignificantDifference = None
-            pValue = -1
+        noSignificantDifference, pValue = getSignificance(main, compare)
 
         if noSignificantDifference is None:
             verdict = ""
@@ -446,7 +1332,10 @@ def analyzeResult(subdir, main, comparisons):
             'Driver': compare.shortVm,
             'Speedup': colored(speedupColor, '{:8.3f}%'.format(speedup * 100)),
             'Significance': verdict,
-            'P(T<=t)': '---' if pValue < 0 else '{:.0f}%'.format(pValue * 100)
+            'P(T<=t)': '---' if pValue < 0 else '{:.0f}%'.format(pValue * 100),
+            **getMemoryColumns(compare),
+            **getRobustColumns(compare),
+            **getRobustComparisonColumns(main, compare)
         })
 
         print(colored(Color.YELLOW, 'SUCCESS') + ': {:<40}'.format(main.name) + ": " + '{:8.3f}'.format(compare.avg) + "ms +/- " +
@@ -454,7 +1343,7 @@ def analyzeResult(subdir, main, comparisons):
             ' ({:+7.3f}%, '.format(speedup * 100) + verdict + ")")
 
         if influxReporter != None:
-            influxReporter.report_result(subdir, main.name, main.filename, "SUCCESS", compare.min, compare.avg, compare.max, compare.sampleConfidenceInterval, compare.shortVm, compare.vm)
+            influxReporter.report_result(subdir, main.name, main.filename, "SUCCESS", compare.min, compare.avg, compare.max, compare.sampleConfidenceInterval, compare.shortVm, compare.vm, compare.values + compare.outliers)
 
         if arguments.speedup:
             oldValue = plotValueLists[0].pop()
@@ -468,21 +1357,264 @@ def analyzeResult(subdir, main, comparisons):
             plotValueLists[index].append(compare.avg * scale)
             plotConfIntLists[index].append(compare.sampleConfidenceInterval * scale)
 
-        vmTotalMin[index] += compare.min
-        vmTotalAverage[index] += compare.avg
+        if complete:
+            vmTotalMin[index] += compare.min
+            vmTotalAverage[index] += compare.avg
+
         vmTotalImprovement[index] += math.log(main.avg / compare.avg)
         vmTotalResults[index] += 1
 
-def runTest(subdir, filename, filepath):
+        if arguments.callgrind_diff > 0 and speedup * 100 < -arguments.callgrind_diff_threshold:
+            analyzeFunctionCosts(main, compare, speedup)
+
+        accumulateDrift(index, compare)
+
+def getExecutionOrder(count, filename, round):
+    order = list(range(count))
+
+    if arguments.order == 'abba':
+        # Counterbalance the position of each VM in a round so that slow drift affects all of them equally
+        if round % 2 == 1:
+            order.reverse()
+    elif arguments.order == 'rotate':
+        order = order[round % count:] + order[:round % count]
+    elif arguments.order == 'random':
+        # Seed with the test name so that the order doesn't depend on which other tests are selected
+        random.Random(f"{arguments.seed}:{filename}:{round}").shuffle(order)
+
+    return order
+
+class PendingTest:
+    subdir = ""
+    filename = ""
+    filepath = ""
+
+    # Compile mode and source corpus of --compile tests
+    compileMode = None
+    compileFiles = []
+
+    # Process outputs for every loop of the main VM and of every comparison VM
+    vms = []
+    mainOutputs = []
+    compareOutputs = []
+
+    # Baseline cache entry of the main VM and the amount of loops reused from it
+    cacheKey = None
+    cacheEntry = None
+    cachedLoops = 0
+
+def scheduleTest(subdir, filename, filepath, compileMode=None, compileFiles=[]):
     filepath = os.path.abspath(filepath)
 
     mainVm = os.path.abspath(arguments.vm)
+    compareVms = [os.path.abspath(compareVm) for compareVm in arguments.vmNext] if arguments.vmNext != None else []
+
+    test = PendingTest()
+
+    test.subdir = subdir
+    test.filename = filename
+    test.filepath = filepath
+    test.compileMode = compileMode
+    test.compileFiles = [os.path.abspath(file) for file in compileFiles]
+    test.mainOutputs = []
+    test.compareOutputs = [[] for compareVm in compareVms]
+
+    test.vms = [mainVm] + compareVms
+
+    if arguments.baseline_cache != None:
+        loadCachedBaseline(test)
+
+    for round in range(arguments.extra_loops + 1):
+        scheduleRound(test, round)
+
+    return test
+
+# VM outputs are streamed to a JSON Lines file as soon as they are ready, so that an interrupted run can be resumed
+resultStream = None
+resultStreamLock = threading.Lock()
+resumedOutputs = {}
+
+def openResultStream():
+    global resultStream
+
+    path = arguments.filename + ".jsonl"
+
+    if arguments.resume and os.path.exists(path):
+        with open(path) as file:
+            for line in file:
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    # The last line can be incomplete if the run was killed
+                    continue
+
+                resumedOutputs[(item['test'], item['name'], item['vm'], item['round'])] = item['output']
+
+        print(f"Resuming with {len(resumedOutputs)} completed runs from '{path}'")
+
+    resultStream = open(path, "a" if arguments.resume else "w")
+
+def streamOutput(test, vm, round, future):
+    if future.cancelled() or future.exception() != None:
+        return
+
+    output = future.result()
+
+    # Failed or interrupted runs are not recorded so that they are repeated on resume
+    if output.find("||_||") == -1:
+        return
+
+    with resultStreamLock:
+        # Runs that were already started can still finish after an interrupted run has closed the file
+        if resultStream.closed:
+            return
+
+        resultStream.write(json.dumps({ 'test': test.filepath, 'name': test.filename, 'vm': vm, 'round': round, 'output': output }) + "\n")
+        resultStream.flush()
+
+def closeResultStream():
+    with resultStreamLock:
+        resultStream.close()
+
+hostFingerprint = None
+
+def getHostFingerprint():
+    global hostFingerprint
+
+    if hostFingerprint == None:
+        cpu = platform.processor()
+
+        try:
+            with open("/proc/cpuinfo") as file:
+                for line in file:
+                    if line.startswith("model name"):
+                        cpu = line.split(":", 1)[1].strip()
+                        break
+        except OSError:
+            pass
+
+        hostFingerprint = { 'host': socket.gethostname(), 'system': platform.system(), 'release': platform.release(), 'machine': platform.machine(), 'cpu': cpu, 'cpus': os.cpu_count() }
+
+    return hostFingerprint
+
+def getCpuGovernor():
+    governors = []
+
+    for core in getBenchmarkCores():
+        try:
+            with open(f"/sys/devices/system/cpu/cpu{core}/cpufreq/scaling_governor") as file:
+                governors.append(file.read().strip())
+        except OSError:
+            governors.append("")
+
+    return governors
+
+def getBaselineCacheKey(test, vm):
+    executable, flags = getVmExecutable(vm)
+    files = test.compileFiles if test.compileMode != None else [test.filepath]
+
+    # Paths don't matter, only the contents of the binary, tests and everything else that affects measurements
+    key = {
+        'vm': getFileHash(executable),
+        'flags': flags,
+        'command': substituteArguments("", getExtraArguments(test.filepath) if test.compileMode == None else test.compileMode),
+        'test': test.filename,
+        'files': [getFileHash(file) for file in files],
+        'support': getFileHash(os.path.join(scriptdir, "bench_support.lua")),
+        'mode': [arguments.callgrind, arguments.perf_stat and arguments.perf_events, arguments.compile_loops if test.compileMode != None else 0, arguments.gc_stats],
+        'host': getHostFingerprint(),
+        'governor': getCpuGovernor()
+    }
+
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+def loadCachedBaseline(test):
+    test.cacheKey = getBaselineCacheKey(test, test.vms[0])
+    test.cacheEntry = None
+    test.cachedLoops = 0
+
+    try:
+        with open(os.path.join(arguments.baseline_cache, test.cacheKey + ".json")) as file:
+            entry = json.load(file)
+    except (OSError, ValueError):
+        return
+
+    if time.time() - entry['created'] > arguments.baseline_cache_max_age * 3600:
+        return
+
+    test.cacheEntry = entry
+
+    minLoops = arguments.baseline_cache_min_loops if arguments.baseline_cache_min_loops != None else arguments.extra_loops + 1
+
+    if len(entry['outputs']) >= minLoops:
+        test.cachedLoops = len(entry['outputs'])
+
+        print(colored(Color.BLUE, 'CACHED') + ": '" + test.filename + "' on '" + getShortVmName(test.vms[0]) + "' reuses " + str(test.cachedLoops) + " loops")
+
+def updateCachedBaseline(test):
+    outputs = [future.result() for future in test.mainOutputs[test.cachedLoops:]]
+    outputs = [output for output in outputs if output.find("||_||") != -1]
+
+    if len(outputs) == 0:
+        return
+
+    # Entries that are too small to be reused are extended, so that they can be reused next time
+    if test.cacheEntry != None:
+        entry = { 'created': test.cacheEntry['created'], 'outputs': test.cacheEntry['outputs'] + outputs }
+    else:
+        entry = { 'created': time.time(), 'outputs': outputs }
+
+    os.makedirs(arguments.baseline_cache, exist_ok=True)
+
+    path = os.path.join(arguments.baseline_cache, test.cacheKey + ".json")
+
+    with open(path + ".tmp", "w") as file:
+        json.dump(entry, file)
+
+    os.replace(path + ".tmp", path)
+
+def scheduleRound(test, round, priority=CorePool.PRIORITY_NORMAL):
+    outputs = [test.mainOutputs] + test.compareOutputs
 
     # Process output will contain the test name and execution times
-    mainOutput = getVmOutput(substituteArguments(mainVm, getExtraArguments(filepath)) + " " + filepath)
-    mainResultSet = extractResults(filename, mainVm, mainOutput, False)
+    for index in getExecutionOrder(len(test.vms), test.filename, round):
+        vm = test.vms[index]
+        resumedOutput = resumedOutputs.get((test.filepath, test.filename, vm, round))
+
+        if resumedOutput == None and index == 0 and round < test.cachedLoops:
+            resumedOutput = test.cacheEntry['outputs'][round]
+
+        if resumedOutput != None:
+            future = Future()
+            future.set_result(resumedOutput)
+        else:
+            if test.compileMode != None:
+                future = corePool.submitCompile(vm, test.compileMode, test.compileFiles, priority)
+            else:
+                future = corePool.submit(vm, test.filepath, priority)
+
+            future.add_done_callback(lambda future, vm=vm: streamOutput(test, vm, round, future))
+
+        outputs[index].append(future)
+
+def cancelTest(test):
+    for future in test.mainOutputs:
+        future.cancel()
+
+    for outputs in test.compareOutputs:
+        for future in outputs:
+            future.cancel()
+
+def runTest(test):
+    subdir, filename, filepath = test.subdir, test.filename, test.filepath
+
+    mainVm = os.path.abspath(arguments.vm)
+
+    mainResultSet = extractResults(filename, mainVm, test.mainOutputs[0].result(), False)
 
     if len(mainResultSet) == 0:
+        cancelTest(test)
+
         print(colored(Color.RED, 'FAILED') + ":  '" + filepath + "' on '" + mainVm +  "'")
 
         if arguments.vmNext != None:
@@ -492,37 +1624,23 @@ def runTest(subdir, filename, filepath):
 
         if influxReporter != None:
             influxReporter.report_result(subdir, filename, filename, "FAILED", 0.0, 0.0, 0.0, 0.0, getShortVmName(mainVm), mainVm)
+
+        gateEntries.append([filepath, createMissingResult(filename, None, mainVm, getShortVmName(mainVm))])
         return
 
     compareResultSets = []
 
     if arguments.vmNext != None:
-        for compareVm in arguments.vmNext:
+        for compareVm, outputs in zip(arguments.vmNext, test.compareOutputs):
             compareVm = os.path.abspath(compareVm)
 
-            compareOutput = getVmOutput(substituteArguments(compareVm, getExtraArguments(filepath)) + " " + filepath)
-            compareResultSet = extractResults(filename, compareVm, compareOutput, True)
+            compareResultSet = extractResults(filename, compareVm, outputs[0].result(), True)
 
             compareResultSets.append(compareResultSet)
 
-    if arguments.extra_loops > 0:
-        # get more results
-        for i in range(arguments.extra_loops):
-            extraMainOutput = getVmOutput(substituteArguments(mainVm, getExtraArguments(filepath)) + " " + filepath)
-            extraMainResultSet = extractResults(filename, mainVm, extraMainOutput, False)
-
-            mergeResults(mainResultSet, extraMainResultSet)
-
-            if arguments.vmNext != None:
-                i = 0
-                for compareVm in arguments.vmNext:
-                    compareVm = os.path.abspath(compareVm)
-
-                    extraCompareOutput = getVmOutput(substituteArguments(compareVm, getExtraArguments(filepath)) + " " + filepath)
-                    extraCompareResultSet = extractResults(filename, compareVm, extraCompareOutput, True)
-
-                    mergeResults(compareResultSets[i], extraCompareResultSet)
-                    i += 1
+    # get more results
+    for i in range(1, arguments.extra_loops + 1):
+        mergeRound(test, i, mainResultSet, compareResultSets)
 
     # finalize results
     for result in mainResultSet:
@@ -532,6 +1650,18 @@ def runTest(subdir, filename, filepath):
         for result in compareResultSet:
             finalizeResult(result)
 
+    if arguments.target_ci != None:
+        runAdaptiveRounds(test, mainResultSet, compareResultSets)
+
+    if arguments.gate != None:
+        confirmGateRegressions(test, filepath, mainResultSet, compareResultSets)
+
+    for result in mainResultSet + [result for compareResultSet in compareResultSets for result in compareResultSet]:
+        result.folder = subdir
+
+    if arguments.baseline_cache != None:
+        updateCachedBaseline(test)
+
     # analyze results
     for i in range(len(mainResultSet)):
         mainResult = mainResultSet[i]
@@ -543,21 +1673,90 @@ def runTest(subdir, filename, filepath):
             else:
                 noResult = TestResult()
 
-                noResult.filename = el[0].filename
-                noResult.vm = el[0].vm
-                noResult.shortVm = el[0].shortVm
+                noResult.filename = el[0].filename
+                noResult.vm = el[0].vm
+                noResult.shortVm = el[0].shortVm
+
+                compareResults.append(noResult)
+
+        analyzeResult(subdir, mainResult, compareResults)
+
+        gateEntries.append([filepath, mainResult])
+
+        mergedResults = []
+        mergedResults.append(mainResult)
+
+        for el in compareResults:
+            mergedResults.append(el)
+
+        allResults.append(mergedResults)
+
+def mergeRound(test, i, mainResultSet, compareResultSets):
+    filename = test.filename
+    mainVm = os.path.abspath(arguments.vm)
+
+    extraMainResultSet = extractResults(filename, mainVm, test.mainOutputs[i].result(), False, i)
+
+    mergeResults(mainResultSet, extraMainResultSet)
+
+    if arguments.vmNext != None:
+        for j, compareVm in enumerate(arguments.vmNext):
+            compareVm = os.path.abspath(compareVm)
+
+            extraCompareResultSet = extractResults(filename, compareVm, test.compareOutputs[j][i].result(), True, i)
+
+            mergeResults(compareResultSets[j], extraCompareResultSet)
+
+def isConverged(mainResultSet, compareResultSets):
+    for i, main in enumerate(mainResultSet):
+        mainConverged = main.avg > 0 and main.sampleConfidenceInterval / main.avg * 100 <= arguments.target_ci
+
+        if len(compareResultSets) == 0 and not mainConverged:
+            return False
+
+        for compareResultSet in compareResultSets:
+            if i >= len(compareResultSet) or compareResultSet[i].min == None:
+                continue
+
+            compare = compareResultSet[i]
+            compareConverged = compare.avg > 0 and compare.sampleConfidenceInterval / compare.avg * 100 <= arguments.target_ci
+
+            # A significant difference is as good as a tight interval since extra samples won't change the verdict
+            noSignificantDifference, pValue = getSignificance(main, compare)
+
+            if noSignificantDifference != False and not (mainConverged and compareConverged):
+                return False
+
+    return True
+
+def runAdaptiveRounds(test, mainResultSet, compareResultSets):
+    elapsed = 0.0
+    round = arguments.extra_loops + 1
+
+    while not isConverged(mainResultSet, compareResultSets):
+        if round >= arguments.max_loops or elapsed >= arguments.max_time:
+            print(colored(Color.YELLOW, 'WARNING') + ": '" + test.filename + "' didn't reach the target confidence interval in " + str(round) + " loops")
+            return
 
-                compareResults.append(noResult)
+        # Extra rounds skip ahead of the rounds scheduled for the rest of the suite
+        scheduleRound(test, round, CorePool.PRIORITY_URGENT)
+        mergeRound(test, round, mainResultSet, compareResultSets)
 
-        analyzeResult(subdir, mainResult, compareResults)
+        # Only the time since the round started running counts, not the time it waited for a free core
+        startTimes = [getattr(outputs[round], 'startTime', None) for outputs in [test.mainOutputs] + test.compareOutputs]
+        startTimes = [startTime for startTime in startTimes if startTime != None]
 
-        mergedResults = []
-        mergedResults.append(mainResult)
+        if len(startTimes) != 0:
+            elapsed += time.monotonic() - min(startTimes)
 
-        for el in compareResults:
-            mergedResults.append(el)
+        for result in mainResultSet:
+            finalizeResult(result)
 
-        allResults.append(mergedResults)
+        for compareResultSet in compareResultSets:
+            for result in compareResultSet:
+                finalizeResult(result)
+
+        round += 1
 
 def rearrangeSortKeyForComparison(e):
     if plotValueLists[1][e] == 0:
@@ -667,6 +1866,50 @@ def graph():
     if arguments.window:
         plt.show()
 
+def graphIterations():
+    resultSets = [resultSet for resultSet in allResults if any(len(result.timelines) != 0 for result in resultSet)]
+
+    if len(resultSets) == 0:
+        return
+
+    columns = min(len(resultSets), 3)
+    rows = (len(resultSets) + columns - 1) // columns
+
+    figure, axes = plt.subplots(rows, columns, figsize=(5 * columns, 3.5 * rows), squeeze=False)
+
+    for index, resultSet in enumerate(resultSets):
+        plot = axes[index // columns][index % columns]
+
+        for result in resultSet:
+            if len(result.timelines) == 0:
+                continue
+
+            # Median over all runs of the test for every iteration
+            length = min(len(timeline['order']) for timeline in result.timelines)
+            series = [sorted(timeline['order'][i] for timeline in result.timelines)[len(result.timelines) // 2] for i in range(length)]
+
+            line = plot.plot(range(1, length + 1), series, label=result.shortVm)
+
+            warmupRuns = getWarmup(series)[0]
+
+            if warmupRuns > 0:
+                plot.axvline(warmupRuns + 0.5, color=line[0].get_color(), linestyle='--')
+
+        plot.set_title(resultSet[0].name, fontsize=10)
+        plot.set_xlabel('Iteration')
+        plot.set_ylabel('Time (ms)')
+
+    for index in range(len(resultSets), rows * columns):
+        axes[index // columns][index % columns].axis('off')
+
+    axes[0][0].legend()
+
+    figure.tight_layout()
+    figure.savefig(arguments.filename + "-iterations.png", dpi=100)
+
+    if arguments.window:
+        plt.show()
+
 def addTotalsToTable():
     if len(vmTotalMin) == 0:
         return
@@ -688,6 +1931,10 @@ def addTotalsToTable():
         for compareVm in arguments.vmNext:
             index = index + 1
 
+            # VM failed on every test
+            if vmTotalAverage[index] == 0:
+                continue
+
             speedup = vmTotalAverage[0] / vmTotalAverage[index] * 100 - 100
 
             resultPrinter.add_row({
@@ -709,94 +1956,592 @@ def addTotalsToTable():
             'Driver': getShortVmName(os.path.abspath(arguments.vm))
         })
 
+def getResultRunInfo(result, timestamp):
+    # Lets history tools order result files and tell which binary produced them
+    executable, flags = getVmExecutable(result.vm)
+
+    info = { 'timestamp': timestamp, 'host': socket.gethostname(), 'commit': getGitCommit(executable), 'vmHash': getFileHash(executable) }
+
+    if benchEnvironment != None:
+        info['environment'] = benchEnvironment
+
+    # Results loaded with --results keep what was recorded about their own run
+    return { **info, **result.runInfo }
+
 def writeResultsToFile():
-    class TestResultEncoder(json.JSONEncoder):
-        def default(self, obj):
-            if isinstance(obj, TestResult):
-                return [obj.filename, obj.vm, obj.shortVm, obj.name, obj.values, obj.count]
-            return json.JSONEncoder.default(self, obj)
+    timestamp = time.time()
 
     try:
-        with open(arguments.filename + ".json", "w") as allResultsFile:
-            allResultsFile.write(json.dumps(allResults, cls=TestResultEncoder))
+        writeResultFile(arguments.filename + ".json", allResults, lambda result: getResultRunInfo(result, timestamp))
     except:
         print("Failed to write results to a file")
 
-def run(args, argsubcb):
-    global arguments, resultPrinter, influxReporter, argumentSubstituionCallback, allResults
-    arguments = args
-    argumentSubstituionCallback = argsubcb
+def createMissingResult(filename, name, vm, shortVm):
+    result = TestResult()
 
-    if arguments.report_metrics or arguments.print_influx_debugging:
-        import influxbench
-        influxReporter = influxbench.InfluxReporter(arguments)
-    else:
-        influxReporter = None
+    result.filename = filename
+    result.vm = vm
+    result.shortVm = shortVm
+    result.name = name
+    result.missing = True
 
-    if matplotlib == None:
-        arguments.absolute = 0
-        arguments.speedup = 0
-        arguments.sort = 0
-        arguments.window = 0
+    return result
 
-    # Load results from files
-    if arguments.results != None:
-        vmList = []
+def loadResults(paths):
+    global allResults
+
+    vmList = []
+    vmSet = set()
 
-        for result in arguments.results:
-            with open(result) as resultsFile:
-                resultArray = json.load(resultsFile)
+    # VM of every column of the merged results, used to fill in the gaps for tests that are missing from some files
+    columns = []
 
-            for test in resultArray:
-                for i in range(len(test)):
-                    arr = test[i]
+    # Index of each (filename, name) test in allResults
+    testIndex = {}
 
-                    tr = TestResult()
+    # Files are loaded and merged one at a time in the order they were specified, so only one parsed file is kept in memory
+    for path in paths:
+        resultArray = loadResultFile(path)
 
-                    tr.filename = arr[0]
-                    tr.vm = arr[1]
-                    tr.shortVm = arr[2]
-                    tr.name = arr[3]
-                    tr.values = arr[4]
-                    tr.count = arr[5]
+        if len(resultArray) == 0:
+            print(colored(Color.YELLOW, 'WARNING') + ": '" + path + "' doesn't contain any results")
+            continue
 
-                    test[i] = tr
+        fileColumns = [(test.vm, test.shortVm) for test in resultArray[0]]
 
-            for test in resultArray[0]:
-                if vmList.count(test.vm) > 0:
-                    pointPos = result.rfind(".")
+        for vm, shortVm in fileColumns:
+            if vm in vmSet:
+                pointPos = path.rfind(".")
 
-                    if pointPos != -1:
-                        vmList.append(test.vm + " [" + result[0:pointPos] + "]")
-                    else:
-                        vmList.append(test.vm + " [" + result + "]")
+                if pointPos != -1:
+                    vmList.append(vm + " [" + path[0:pointPos] + "]")
                 else:
-                    vmList.append(test.vm)
+                    vmList.append(vm + " [" + path + "]")
+            else:
+                vmList.append(vm)
+                vmSet.add(vm)
+
+        merged = set()
+
+        for test in resultArray:
+            key = (test[0].filename, test[0].name)
 
-            if len(allResults) == 0:
-                allResults = resultArray
+            if key in merged:
+                print(colored(Color.YELLOW, 'WARNING') + ": '" + test[0].name + "' is listed more than once in '" + path + "', ignoring duplicate")
+                continue
+
+            merged.add(key)
+
+            # Tests that failed on some VMs can have fewer entries than the file has VMs
+            for vm, shortVm in fileColumns[len(test):]:
+                test.append(createMissingResult(test[0].filename, test[0].name, vm, shortVm))
+
+            if key in testIndex:
+                allResults[testIndex[key]].extend(test[0:len(fileColumns)])
             else:
-                for prevEl in allResults:
-                    found = False
+                if len(columns) != 0:
+                    print(colored(Color.YELLOW, 'WARNING') + ": '" + test[0].name + "' is missing from results before '" + path + "'")
+
+                testIndex[key] = len(allResults)
+                allResults.append([createMissingResult(test[0].filename, test[0].name, vm, shortVm) for vm, shortVm in columns] + test[0:len(fileColumns)])
+
+        for resultSet in allResults:
+            key = (resultSet[0].filename, resultSet[0].name)
+
+            if key not in merged:
+                print(colored(Color.YELLOW, 'WARNING') + ": '" + resultSet[0].name + "' is missing from '" + path + "'")
+
+                resultSet.extend(createMissingResult(key[0], key[1], vm, shortVm) for vm, shortVm in fileColumns)
+
+        columns += fileColumns
+
+    return vmList
+
+def writeResultsToDatabase():
+    import benchdb
+
+    database = benchdb.BenchDatabase(arguments.db)
+    timestamp = time.time()
+
+    for resultSet in allResults:
+        for result in resultSet:
+            if result.count == 0:
+                continue
+
+            executable, flags = getVmExecutable(result.vm)
+            info = getResultRunInfo(result, timestamp)
+
+            database.add_result(result.filename, result.name, executable, info['vmHash'], info['commit'], info['host'], flags, info['timestamp'], result.values, getResultExtras(result))
+
+    database.commit()
+    database.close()
+
+def printDatabaseHistory():
+    import benchdb
+
+    database = benchdb.BenchDatabase(arguments.db)
+    records = database.query(arguments.db_query, arguments.db_host, arguments.db_limit)
+    database.close()
+
+    historyPrinter = TablePrinter([
+        {'label': 'Time', 'align': Alignment.LEFT},
+        {'label': 'Test', 'align': Alignment.LEFT},
+        {'label': 'Host', 'align': Alignment.LEFT},
+        {'label': 'Commit', 'align': Alignment.LEFT},
+        {'label': 'Driver', 'align': Alignment.LEFT},
+        {'label': 'Count', 'align': Alignment.RIGHT},
+        {'label': 'Min', 'align': Alignment.RIGHT},
+        {'label': 'Average', 'align': Alignment.RIGHT},
+        {'label': 'StdDev%', 'align': Alignment.RIGHT}
+    ])
+
+    for record in records:
+        result = TestResult()
+
+        result.values = record.values
+        result.count = len(record.values)
+
+        finalizeResult(result)
+
+        historyPrinter.add_row({
+            'Time': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record.timestamp)),
+            'Test': record.test_name,
+            'Host': record.host,
+            'Commit': record.git_commit[0:10],
+            'Driver': getShortVmName(record.vm_path + " " + record.flags if record.flags else record.vm_path),
+            'Count': result.count,
+            'Min': '{:8.3f}ms'.format(result.min) if result.min != None else "",
+            'Average': '{:8.3f}ms'.format(result.avg),
+            'StdDev%': '{:8.3f}%'.format(result.sampleConfidenceInterval / result.avg * 100) if result.avg > 0 else "---"
+        })
+
+    historyPrinter.print(summary=False)
+
+# Baseline results for --gate by file and test name
+gateBaseline = {}
+
+# File path and main VM result of every test checked by --gate
+gateEntries = []
+
+def loadGateBaseline(path):
+    for resultSet in loadResultFile(path):
+        baseline = finalizeResult(resultSet[0])
+
+        if baseline.count != 0:
+            gateBaseline[(baseline.filename, baseline.name)] = baseline
+
+def getGateThreshold(filepath, name):
+    threshold = 2.0
+    path = filepath.replace(os.sep, "/")
+
+    for rule in arguments.gate_threshold or []:
+        pattern, separator, value = rule.rpartition("=")
+
+        if pattern == "":
+            matches = True
+        elif pattern.endswith("/"):
+            matches = ("/" + pattern) in ("/" + path)
+        else:
+            matches = fnmatch.fnmatchcase(name or "", pattern) or fnmatch.fnmatchcase(os.path.basename(path), pattern) or fnmatch.fnmatchcase(path, pattern)
+
+        if matches:
+            threshold = float(value.rstrip('%'))
+
+    return threshold
+
+def getGateBaselines(result):
+    # When a test file failed, every test from it is checked against the baseline
+    if result.name == None:
+        return [baseline for key, baseline in gateBaseline.items() if key[0] == result.filename]
+
+    baseline = gateBaseline.get((result.filename, result.name))
+
+    return [baseline] if baseline != None else []
+
+def getGateVerdict(filepath, baseline, result):
+    threshold = getGateThreshold(filepath, baseline.name)
+
+    if result.count == 0:
+        return threshold, None, -1, True
+
+    change = result.avg / baseline.avg - 1
+    noSignificantDifference, pValue = getSignificance(baseline, result)
+
+    return threshold, change, pValue, change * 100 > threshold and noSignificantDifference != True
+
+def confirmGateRegressions(test, filepath, mainResultSet, compareResultSets):
+    if arguments.gate_confirm_loops <= 0:
+        return
+
+    if not any(getGateVerdict(filepath, baseline, result)[3] for result in mainResultSet for baseline in getGateBaselines(result)):
+        return
+
+    print(colored(Color.YELLOW, 'CONFIRMING') + ": '" + test.filename + "' with " + str(arguments.gate_confirm_loops) + " extra loops")
+
+    # Extra loops run before the results are analyzed, so that every table shows the confirmed results
+    firstRound = len(test.mainOutputs)
+
+    for round in range(firstRound, firstRound + arguments.gate_confirm_loops):
+        scheduleRound(test, round, CorePool.PRIORITY_URGENT)
+
+    for round in range(firstRound, firstRound + arguments.gate_confirm_loops):
+        mergeRound(test, round, mainResultSet, compareResultSets)
+
+    for result in mainResultSet:
+        finalizeResult(result)
+
+    for compareResultSet in compareResultSets:
+        for result in compareResultSet:
+            finalizeResult(result)
+
+def printGateReport():
+    gatePrinter = TablePrinter([
+        {'label': 'Test', 'align': Alignment.LEFT},
+        {'label': 'Baseline', 'align': Alignment.RIGHT},
+        {'label': 'Current', 'align': Alignment.RIGHT},
+        {'label': 'Change', 'align': Alignment.RIGHT},
+        {'label': 'Threshold', 'align': Alignment.RIGHT},
+        {'label': 'P(T<=t)', 'align': Alignment.RIGHT}
+    ])
+
+    regressions = 0
+    totalChange = 0.0
+    totalResults = 0
+
+    for filepath, result in gateEntries:
+        for baseline in getGateBaselines(result):
+            threshold, change, pValue, regressed = getGateVerdict(filepath, baseline, result)
+
+            if change != None:
+                totalChange += math.log(1 + change)
+                totalResults += 1
+
+            if not regressed:
+                continue
+
+            regressions += 1
+
+            gatePrinter.add_row({
+                'Test': baseline.name,
+                'Baseline': '{:8.3f}ms'.format(baseline.avg),
+                'Current': 'FAILED' if change == None else '{:8.3f}ms'.format(result.avg),
+                'Change': '' if change == None else colored(Color.RED, '{:+8.3f}%'.format(change * 100)),
+                'Threshold': '{:.1f}%'.format(threshold),
+                'P(T<=t)': '---' if pValue < 0 else '{:.0f}%'.format(pValue * 100)
+            })
+
+    geomeanChange = math.exp(totalChange / totalResults) - 1 if totalResults != 0 else 0.0
+    geomeanFailed = arguments.gate_geomean != None and geomeanChange * 100 > arguments.gate_geomean
+
+    print()
+    print(colored(Color.YELLOW, '===================================================GATE===================================================='))
+
+    if regressions != 0:
+        gatePrinter.print(summary=False)
+
+    print("Geometric mean change over {} tests compared to the baseline is {:+.3f}%".format(totalResults, geomeanChange * 100))
+
+    if regressions == 0 and not geomeanFailed:
+        print(colored(Color.GREEN, 'PASSED') + ": no regressions compared to '" + arguments.gate + "'")
+        return 0
+
+    if geomeanFailed:
+        print(colored(Color.RED, 'FAILED') + ": geometric mean change is above the {:.1f}% threshold".format(arguments.gate_geomean))
+
+    if regressions != 0:
+        print(colored(Color.RED, 'FAILED') + ": " + str(regressions) + " tests regressed compared to '" + arguments.gate + "'")
+
+    return 1
 
-                    for nextEl in resultArray:
-                        if nextEl[0].filename == prevEl[0].filename and nextEl[0].name == prevEl[0].name:
-                            for run in nextEl:
-                                prevEl.append(run)
-                            found = True
+# Axes of --matrix as (name, [arguments]) and value indices of every VM configuration
+matrixAxes = []
+matrixConfigs = []
 
-                    if not found:
-                        el = resultArray[0]
+def setupMatrix():
+    for spec in arguments.matrix:
+        name, separator, values = spec.partition("=")
 
-                        for run in el:
-                            result = TestResult()
+        if separator == "" or name == "":
+            print("--matrix axis '" + spec + "' should be NAME=ARGS|ARGS|...")
+            exit(1)
+
+        matrixAxes.append((name, [value.strip() for value in values.split("|")]))
+
+    matrixConfigs.extend(itertools.product(*[range(len(values)) for name, values in matrixAxes]))
+
+    vms = []
+
+    for config in matrixConfigs:
+        vmArguments = [matrixAxes[axis][1][value] for axis, value in enumerate(config) if matrixAxes[axis][1][value] != ""]
+        vms.append(" ".join([arguments.vm] + vmArguments))
+
+    arguments.vm = vms[0]
+    arguments.vmNext = vms[1:]
+
+def getMatrixLabel(axis, value):
+    return matrixAxes[axis][1][value] or "(none)"
+
+def getMatrixEffects(resultSet, axis):
+    # Time of every value of the axis relative to the first value, paired over the values of all other axes
+    effects = [[] for value in matrixAxes[axis][1]]
+    times = {}
+
+    for config, result in zip(matrixConfigs, resultSet):
+        if result.count != 0 and result.avg > 0:
+            times[config] = result.avg
+
+    for config, avg in times.items():
+        baseConfig = config[:axis] + (0,) + config[axis + 1:]
+
+        if baseConfig in times:
+            effects[config[axis]].append(math.log(avg / times[baseConfig]))
+
+    return effects
+
+def printMatrixTables():
+    for axis, (name, values) in enumerate(matrixAxes):
+        if len(values) < 2:
+            continue
+
+        matrixPrinter = TablePrinter([{'label': 'Test', 'align': Alignment.LEFT}] + [{'label': name + ": " + getMatrixLabel(axis, value), 'align': Alignment.RIGHT} for value in range(len(values))])
+
+        totals = [[] for value in values]
+
+        for resultSet in allResults:
+            effects = getMatrixEffects(resultSet, axis)
+            baseTimes = [result.avg for config, result in zip(matrixConfigs, resultSet) if config[axis] == 0 and result.count != 0 and result.avg > 0]
+
+            if len(baseTimes) == 0:
+                continue
+
+            # Time of the first value is shown as a geomean over the other axes, other values as a relative change
+            row = { 'Test': resultSet[0].name, name + ": " + getMatrixLabel(axis, 0): '{:8.3f}ms'.format(math.exp(sum(math.log(time) for time in baseTimes) / len(baseTimes))) }
+
+            for value in range(1, len(values)):
+                if len(effects[value]) == 0:
+                    continue
+
+                change = math.exp(sum(effects[value]) / len(effects[value])) - 1
+                row[name + ": " + getMatrixLabel(axis, value)] = colored(Color.RED if change > 0 else Color.GREEN, '{:+8.3f}%'.format(change * 100))
+                totals[value] += effects[value]
+
+            matrixPrinter.add_row(row)
+
+        geomeanRow = { 'Test': 'Geomean', name + ": " + getMatrixLabel(axis, 0): '---' }
+
+        for value in range(1, len(values)):
+            if len(totals[value]) != 0:
+                change = math.exp(sum(totals[value]) / len(totals[value])) - 1
+                geomeanRow[name + ": " + getMatrixLabel(axis, value)] = colored(Color.RED if change > 0 else Color.GREEN, '{:+8.3f}%'.format(change * 100))
+
+        matrixPrinter.add_row(geomeanRow)
+
+        print()
+        print(colored(Color.YELLOW, 'MATRIX') + ": time change of every '" + name + "' value compared to '" + getMatrixLabel(axis, 0) + "', averaged over all other axes")
+        matrixPrinter.print(summary=False)
+
+def getMetricAverage(result, metric):
+    values = result.metrics.get(metric, [])
+
+    return sum(values) / len(values) if len(values) != 0 else None
+
+def printGcTable():
+    gcPrinter = TablePrinter([
+        {'label': 'Test', 'align': Alignment.LEFT},
+        {'label': 'Driver', 'align': Alignment.LEFT},
+        {'label': 'Average', 'align': Alignment.RIGHT},
+        {'label': 'GC%', 'align': Alignment.RIGHT},
+        {'label': 'GC time', 'align': Alignment.RIGHT},
+        {'label': 'Max pause', 'align': Alignment.RIGHT},
+        {'label': 'P50 pause', 'align': Alignment.RIGHT},
+        {'label': 'P90 pause', 'align': Alignment.RIGHT},
+        {'label': 'P99 pause', 'align': Alignment.RIGHT},
+        {'label': 'Steps', 'align': Alignment.RIGHT},
+        {'label': 'Cycles', 'align': Alignment.RIGHT},
+        {'label': 'Alloc/iter', 'align': Alignment.RIGHT}
+    ])
+
+    for resultSet in allResults:
+        for result in resultSet:
+            if result.count == 0 or 'gc_steps' not in result.metrics:
+                continue
+
+            # Pause percentiles are computed for each run and averaged, like all other values in this table
+            allocated = getMetricAverage(result, 'alloc_kb')
+
+            row = {
+                'Test': result.name,
+                'Driver': result.shortVm,
+                'Average': '{:8.3f}ms'.format(result.avg),
+                'GC%': '{:6.2f}%'.format(getMetricAverage(result, 'gc_share')),
+                'GC time': '{:8.3f}ms'.format(getMetricAverage(result, 'gc_ms')),
+                'Steps': '{:.0f}'.format(getMetricAverage(result, 'gc_steps')),
+                'Cycles': '{:.1f}'.format(getMetricAverage(result, 'gc_cycles')),
+                'Alloc/iter': '{:8.1f}KB'.format(allocated) if allocated != None else "---",
+                'Max pause': '{:8.1f}us'.format(max(result.metrics['gc_pause_max']) * 1000)
+            }
+
+            for column, metric in [('P50 pause', 'gc_pause_p50'), ('P90 pause', 'gc_pause_p90'), ('P99 pause', 'gc_pause_p99')]:
+                row[column] = '{:8.1f}us'.format(getMetricAverage(result, metric) * 1000)
+
+            gcPrinter.add_row(row)
+
+    if gcPrinter.is_empty():
+        print(colored(Color.YELLOW, 'WARNING') + ": no GC statistics were reported, the VM might not support --gc-stats")
+        return
+
+    print()
+    print(colored(Color.YELLOW, '==================================================GC======================================================='))
+    gcPrinter.print(summary=False)
+    print(colored(Color.YELLOW, '---'))
+
+# Tests comparing different ways of doing the same thing, e.g. test_AbsSum_math_abs.lua
+# Names of the test groups that are compared by --variant-groups
+variantGroupNames = []
+
+def getVariantGroups():
+    groups = {}
+
+    # Tests of other folders share the naming scheme without being alternatives of each other, so groups are listed explicitly
+    for resultSet in allResults:
+        filename = os.path.splitext(os.path.basename(resultSet[0].filename))[0]
+
+        for group in variantGroupNames:
+            if filename.startswith("test_" + group + "_"):
+                # Folders can have their own tests of the same group, which are measured separately
+                groups.setdefault((resultSet[0].folder, group), []).append((filename[len(group) + 6:], resultSet))
+
+    # A group needs at least two variants to compare
+    return { key: variants for key, variants in groups.items() if len(variants) > 1 }
+
+def getVariantGroupLabel(key, keys):
+    folder, group = key
+
+    if len(set(folder for folder, group in keys)) > 1:
+        return os.path.basename(folder) + "/" + group
+
+    return group
+
+def getVariantRanks(variants, column):
+    # Variants are identified by their position, since a file can have several tests with the same variant name
+    times = sorted((resultSet[column].avg, index) for index, (variant, resultSet) in enumerate(variants) if column < len(resultSet) and resultSet[column].count != 0 and resultSet[column].avg > 0)
+
+    return { index: (rank + 1, time, time / times[0][0] - 1) for rank, (time, index) in enumerate(times) }
+
+def printVariantGroups():
+    groups = getVariantGroups()
+
+    if len(groups) == 0:
+        return
+
+    labels = []
+
+    for result in allResults[0]:
+        label = result.shortVm
+
+        while label in labels:
+            label += "'"
+
+        labels.append(label)
+
+    variantPrinter = TablePrinter([{'label': 'Group', 'align': Alignment.LEFT}, {'label': 'Variant', 'align': Alignment.LEFT}] + [{'label': label, 'align': Alignment.RIGHT} for label in labels] + ([{'label': 'Ranking', 'align': Alignment.LEFT}] if len(labels) > 1 else []))
+
+    for key, variants in sorted(groups.items()):
+        group = getVariantGroupLabel(key, groups.keys())
+        ranks = [getVariantRanks(variants, column) for column in range(len(labels))]
+
+        # Variants are listed from the fastest to the slowest on the main VM
+        for index in sorted(range(len(variants)), key=lambda index: ranks[0][index][0] if index in ranks[0] else math.inf):
+            variant, resultSet = variants[index]
+
+            # Tests of one file share the variant name, so their test names tell them apart
+            if any(other == variant for otherIndex, (other, otherResultSet) in enumerate(variants) if otherIndex != index):
+                variant += " (" + resultSet[0].name + ")"
+
+            row = { 'Group': group, 'Variant': variant }
+
+            for column, label in enumerate(labels):
+                if index not in ranks[column]:
+                    row[label] = "FAILED"
+                    continue
+
+                rank, time, cost = ranks[column][index]
+
+                if rank == 1:
+                    row[label] = colored(Color.GREEN, '1. {:8.3f}ms'.format(time))
+                else:
+                    row[label] = str(rank) + '. ' + colored(Color.RED if cost > 0.05 else Color.YELLOW, '{:+8.2f}%'.format(cost * 100))
+
+            if len(labels) > 1:
+                mainRank = ranks[0].get(index, (None,))[0]
+                changes = [labels[column] + " " + str(ranks[column][index][0]) for column in range(1, len(labels)) if index in ranks[column] and ranks[column][index][0] != mainRank]
+
+                row['Ranking'] = colored(Color.YELLOW, "changed: " + ", ".join(changes)) if len(changes) != 0 else ""
+
+            variantPrinter.add_row(row)
+
+    print()
+    print(colored(Color.YELLOW, 'VARIANTS') + ": rank of every variant in its group with the time of the fastest one and the relative cost of the others")
+    variantPrinter.print(summary=False)
+
+    # Fastest variant of each group on the main VM, and where the other VMs disagree
+    for key, variants in sorted(groups.items()):
+        ranks = [getVariantRanks(variants, column) for column in range(len(labels))]
+        fastest = [next((variants[index][0] for index, (rank, time, cost) in columnRanks.items() if rank == 1), None) for columnRanks in ranks]
+
+        if len(labels) > 1 and any(variant != fastest[0] for variant in fastest[1:] if variant != None):
+            print("'{}' fastest variant: ".format(getVariantGroupLabel(key, groups.keys())) + ", ".join("{} on {}".format(variant, label) for variant, label in zip(fastest, labels) if variant != None))
+
+def run(args, argsubcb):
+    global arguments, resultPrinter, metricPrinter, influxReporter, argumentSubstituionCallback, allResults, corePool
+    arguments = args
+    argumentSubstituionCallback = argsubcb
+
+    if arguments.report_metrics or arguments.print_influx_debugging:
+        import influxbench
+        influxReporter = influxbench.InfluxReporter(arguments)
+    else:
+        influxReporter = None
+
+    if arguments.db_query != None:
+        if arguments.db == None:
+            print("--db-query requires a --db file")
+            exit(1)
+
+        printDatabaseHistory()
+        return
+
+    if arguments.gate != None:
+        try:
+            loadGateBaseline(arguments.gate)
+        except (OSError, ValueError) as e:
+            print("Failed to load --gate baseline '" + arguments.gate + "': " + str(e))
+            exit(1)
+
+    if arguments.variant_groups != None:
+        try:
+            with open(arguments.variant_groups) as groupsFile:
+                variantGroupNames.extend(json.load(groupsFile))
+        except (OSError, ValueError) as e:
+            print("Failed to load --variant-groups list '" + arguments.variant_groups + "': " + str(e))
+            exit(1)
+
+    if matplotlib == None:
+        arguments.absolute = 0
+        arguments.speedup = 0
+        arguments.sort = 0
+        arguments.window = 0
 
-                            result.filename = run.filename
-                            result.vm = run.vm
-                            result.shortVm = run.shortVm
-                            result.name = run.name
+    if arguments.matrix != None:
+        if arguments.vmNext != None or arguments.results != None:
+            print("--matrix can't be combined with --compare or --results")
+            exit(1)
+
+        setupMatrix()
 
-                            prevEl.append(result)
+    # Load results from files
+    if arguments.results != None:
+        vmList = loadResults(arguments.results)
 
         arguments.vmNext = []
 
@@ -816,7 +2561,7 @@ def run(args, argsubcb):
 
     # Results table formatting
     if arguments.vmNext != None:
-        resultPrinter = TablePrinter([
+        resultColumns = [
             {'label': 'Test', 'align': Alignment.LEFT},
             {'label': 'Min', 'align': Alignment.RIGHT},
             {'label': 'Average', 'align': Alignment.RIGHT},
@@ -824,16 +2569,64 @@ def run(args, argsubcb):
             {'label': 'Driver', 'align': Alignment.LEFT},
             {'label': 'Speedup', 'align': Alignment.RIGHT},
             {'label': 'Significance', 'align': Alignment.LEFT},
-            {'label': 'P(T<=t)', 'align': Alignment.RIGHT}
-        ])
+            {'label': 'P(T<=t)', 'align': Alignment.RIGHT},
+            {'label': 'Peak RSS', 'align': Alignment.RIGHT},
+            {'label': 'Heap', 'align': Alignment.RIGHT}
+        ]
     else:
-        resultPrinter = TablePrinter([
+        resultColumns = [
             {'label': 'Test', 'align': Alignment.LEFT},
             {'label': 'Min', 'align': Alignment.RIGHT},
             {'label': 'Average', 'align': Alignment.RIGHT},
             {'label': 'StdDev%', 'align': Alignment.RIGHT},
-            {'label': 'Driver', 'align': Alignment.LEFT}
-        ])
+            {'label': 'Driver', 'align': Alignment.LEFT},
+            {'label': 'Peak RSS', 'align': Alignment.RIGHT},
+            {'label': 'Heap', 'align': Alignment.RIGHT}
+        ]
+
+    if arguments.robust_stats and numpy == None:
+        print("Warning: numpy package is not installed, robust statistics will not be available")
+        arguments.robust_stats = False
+
+    if arguments.robust_stats:
+        resultColumns += [
+            {'label': 'P50', 'align': Alignment.RIGHT},
+            {'label': 'P90', 'align': Alignment.RIGHT},
+            {'label': 'P99', 'align': Alignment.RIGHT},
+            {'label': 'MAD%', 'align': Alignment.RIGHT}
+        ]
+
+        if arguments.vmNext != None:
+            resultColumns += [
+                {'label': 'Median speedup CI', 'align': Alignment.RIGHT},
+                {'label': 'U-test', 'align': Alignment.LEFT},
+                {'label': 'P(U)', 'align': Alignment.RIGHT}
+            ]
+
+    resultPrinter = TablePrinter(resultColumns)
+
+    metricPrinter = TablePrinter([
+        {'label': 'Test', 'align': Alignment.LEFT},
+        {'label': 'Metric', 'align': Alignment.LEFT},
+        {'label': 'Average', 'align': Alignment.RIGHT},
+        {'label': 'StdDev%', 'align': Alignment.RIGHT},
+        {'label': 'Driver', 'align': Alignment.LEFT},
+        {'label': 'Speedup', 'align': Alignment.RIGHT},
+        {'label': 'Significance', 'align': Alignment.LEFT},
+        {'label': 'P(T<=t)', 'align': Alignment.RIGHT}
+    ])
+
+    if arguments.perf_stat and (os.name == "nt" or sys.platform == "darwin" or arguments.callgrind):
+        print("--perf-stat is only supported on Linux and can't be combined with --callgrind")
+        exit(1)
+
+    if arguments.server and (os.name == "nt" or arguments.callgrind or arguments.perf_stat):
+        print("--server is not supported on Windows and can't be combined with --callgrind or --perf-stat")
+        exit(1)
+
+    if arguments.compile and (arguments.callgrind or arguments.perf_stat or arguments.server):
+        print("--compile can't be combined with --callgrind, --perf-stat or --server")
+        exit(1)
 
     if arguments.results != None:
         for resultSet in allResults:
@@ -845,18 +2638,70 @@ def run(args, argsubcb):
             mainResult = resultSet[0]
             compareResults = []
 
+            if mainResult.count == 0:
+                print(colored(Color.RED, 'MISSING') + ": '" + mainResult.name + "' on '" + mainResult.vm + "'")
+
+                if arguments.vmNext != None:
+                    resultPrinter.add_row({ 'Test': mainResult.name, 'Min': "", 'Average': "MISSING", 'StdDev%': "", 'Driver': mainResult.shortVm, 'Speedup': "", 'Significance': "", 'P(T<=t)': "" })
+                else:
+                    resultPrinter.add_row({ 'Test': mainResult.name, 'Min': "", 'Average': "MISSING", 'StdDev%': "", 'Driver': mainResult.shortVm })
+                continue
+
             for i in range(len(resultSet)):
                 if i != 0:
                     compareResults.append(resultSet[i])
 
             analyzeResult('', mainResult, compareResults)
+
+            # Folder rules of --gate-threshold match the folder the test was loaded from
+            gateEntries.append([os.path.join(mainResult.folder, mainResult.filename) if mainResult.folder else mainResult.filename, mainResult])
     else:
+        global benchEnvironment
+
+        # Callgrind counts instructions, so it doesn't depend on the state of the machine
+        if arguments.preflight != 'off' and sys.platform.startswith("linux") and not arguments.callgrind:
+            benchEnvironment = runPreflight(os.path.abspath(arguments.vm), getBenchmarkCores())
+
+        corePool = CorePool(getBenchmarkCores())
+
+        openResultStream()
+
+        # All work is queued upfront so that parallel jobs stay busy, but results are still analyzed in test order
+        pendingTests = []
+
         all_files = [subdir + os.sep + filename for subdir, dirs, files in os.walk(arguments.folder) for filename in files]
-        for filepath in sorted(all_files):
-            subdir, filename = os.path.split(filepath)
-            if filename.endswith(".lua"):
-                if arguments.run_test == None or re.match(arguments.run_test, filename[:-4]):
-                    runTest(subdir, filename, filepath)
+
+        if arguments.compile:
+            # The whole source corpus is compiled at once, every mode is reported as a separate test
+            corpus = [filepath for filepath in sorted(all_files) if filepath.endswith((".lua", ".luau"))]
+            corpus = [filepath for filepath in corpus if arguments.run_test == None or re.match(arguments.run_test, os.path.splitext(os.path.basename(filepath))[0])]
+
+            if len(corpus) == 0:
+                print("No source files found in '" + arguments.folder + "'")
+                exit(1)
+
+            for mode in arguments.compile:
+                pendingTests.append(scheduleTest(arguments.folder, "compile=" + mode, arguments.folder, mode, corpus))
+        else:
+            for filepath in sorted(all_files):
+                subdir, filename = os.path.split(filepath)
+                if filename.endswith(".lua"):
+                    if arguments.run_test == None or re.match(arguments.run_test, filename[:-4]):
+                        pendingTests.append(scheduleTest(subdir, filename, filepath))
+
+        try:
+            for test in pendingTests:
+                runTest(test)
+        except KeyboardInterrupt:
+            corePool.shutdown(cancel=True)
+            closeResultStream()
+            exit(1)
+
+        corePool.shutdown()
+        closeResultStream()
+
+        if benchEnvironment != None:
+            checkThrottling(benchEnvironment)
 
     if arguments.sort and len(plotValueLists) > 1:
         rearrange(rearrangeSortKeyForComparison)
@@ -875,12 +2720,38 @@ def run(args, argsubcb):
         resultPrinter.print(summary=False)
         print(colored(Color.YELLOW, '---'))
 
+        if vmTotalExcluded != 0:
+            print(colored(Color.YELLOW, 'WARNING') + ": " + str(vmTotalExcluded) + " tests without results on every VM are excluded from the totals")
+
+        for title, functionPrinter in functionDiffs:
+            print()
+            print(colored(Color.YELLOW, 'FUNCTIONS') + ': ' + title)
+            functionPrinter.print(summary=False)
+
+        if not metricPrinter.is_empty():
+            print()
+            print(colored(Color.YELLOW, '==================================================METRICS=================================================='))
+            metricPrinter.print(summary=False)
+            print(colored(Color.YELLOW, '---'))
+
+        if len(matrixAxes) != 0:
+            printMatrixTables()
+
+        if arguments.variant_groups:
+            printVariantGroups()
+
+        if arguments.gc_stats:
+            printGcTable()
+
     if len(vmTotalMin) != 0 and arguments.vmNext != None:
         index = 0
 
         for compareVm in arguments.vmNext:
             index = index + 1
 
+            if vmTotalResults[index] == 0:
+                continue
+
             name = getShortVmName(os.path.abspath(compareVm))
             deltaGeoMean = math.exp(vmTotalImprovement[index] / vmTotalResults[index]) * 100 - 100
 
@@ -889,16 +2760,38 @@ def run(args, argsubcb):
             else:
                 print("'{}' change is {:.3f}% negative on average".format(name, deltaGeoMean))
 
+    if len(vmTotalDriftResults) != 0:
+        vmNames = [arguments.vm] + (arguments.vmNext if arguments.vmNext != None else [])
+
+        for index, vm in enumerate(vmNames):
+            if index >= len(vmTotalDriftResults) or vmTotalDriftResults[index] == 0:
+                continue
+
+            name = getShortVmName(os.path.abspath(vm))
+            driftGeoMean = math.exp(vmTotalDrift[index] / vmTotalDriftResults[index]) * 100 - 100
+
+            # Positive drift means that later rounds were slower, e.g. due to thermal throttling
+            print("'{}' drift between early and late rounds is {:+.3f}% on average".format(name, driftGeoMean))
+
     if matplotlib != None:
         graph()
 
+        if arguments.plot_iterations:
+            graphIterations()
+
     writeResultsToFile()
 
+    if arguments.db != None:
+        writeResultsToDatabase()
+
     if influxReporter != None:
         influxReporter.report_result(arguments.folder, "Total", "all", "SUCCESS", mainTotalMin, mainTotalAverage, mainTotalMax, 0.0, getShortVmName(arguments.vm), os.path.abspath(arguments.vm))
         influxReporter.flush(0)
 
+    if arguments.gate != None:
+        return printGateReport()
+
 
 if __name__ == "__main__":
     arguments = argumentParser.parse_args()
-    run(arguments, None)
+    exit(run(arguments, None))
@@ -17,6 +17,37 @@ function bench.runCode(f, description)
 
     local timeTable = {}
 
+    -- Samples in execution order and the time at which each run started, relative to the first one
+    local orderTable = {}
+    local clockTable = {}
+    local start = os.clock()
+
+    -- Lua heap size in KB before and after each run, if it's available
+    local heapBefore = {}
+    local heapAfter = {}
+
+    -- GC steps during each run, if the VM was started with --gc-stats
+    local gcSteps = {}
+    local gcCycles = {}
+    local gcTime = {}
+    local gcShare = {}
+    local gcPauseMax = {}
+    local gcPauseP50 = {}
+    local gcPauseP90 = {}
+    local gcPauseP99 = {}
+    local allocated = {}
+
+    -- The closure is created once, so that measuring the heap doesn't allocate during the run
+    local function countHeap()
+        return collectgarbage("count")
+    end
+
+    local function heapSize()
+        local ok, size = pcall(countHeap)
+
+        return ok and size or nil
+    end
+
     for i = 1,bench.runs + bench.extraRuns do
         -- try to run GC if it's available
         if collectgarbage then
@@ -25,24 +56,68 @@ function bench.runCode(f, description)
             end)
         end
 
+        -- Heap is measured inside the GC statistics calls, so that the tables they return aren't counted as allocated by the run
+        local gc0 = gcstats and gcstats()
+
+        local before = collectgarbage and heapSize()
+
         local ts0 = os.clock()
 
         local result = f()
 
         local ts1 = os.clock()
 
+        local after = collectgarbage and heapSize()
+
+        local gc1 = gcstats and gcstats()
+
+        if before and after then
+            table.insert(heapBefore, before)
+            table.insert(heapAfter, after)
+        end
+
         -- If test case doesn't return a duration (if only a part of code is measured) we will measure full execution time here
         if not result then
             result = ts1 - ts0
         end
 
+        if gc1 then
+            -- Pause percentiles are computed for each run, so that the output stays small when there are many steps
+            local pauses = gc1.pauses
+            table.sort(pauses)
+
+            local function pausePercentile(p)
+                return #pauses > 0 and pauses[math.max(1, math.ceil(#pauses * p / 100))] * 1000 or 0
+            end
+
+            table.insert(gcPauseMax, pausePercentile(100))
+            table.insert(gcPauseP50, pausePercentile(50))
+            table.insert(gcPauseP90, pausePercentile(90))
+            table.insert(gcPauseP99, pausePercentile(99))
+
+            table.insert(gcSteps, gc1.steps - gc0.steps)
+            table.insert(gcCycles, gc1.cycles - gc0.cycles)
+            table.insert(gcTime, (gc1.pausetime - gc0.pausetime) * 1000)
+            table.insert(gcShare, result > 0 and (gc1.pausetime - gc0.pausetime) / result * 100 or 0)
+
+            -- Memory freed by the collector was allocated during the run as well
+            if before and after then
+                table.insert(allocated, after - before + (gc1.freed - gc0.freed) / 1024)
+            end
+        end
+
         table.insert(timeTable, result)
+        table.insert(orderTable, result * 1000)
+        table.insert(clockTable, (ts0 - start) * 1000)
     end
 
     table.sort(timeTable)
 
+    -- The slowest runs are excluded from the main results but are still reported separately for tail latency statistics
+    local outliers = {}
+
     for i = 1,bench.extraRuns do
-        table.remove(timeTable, #timeTable)
+        table.insert(outliers, 1, (table.remove(timeTable, #timeTable) * 1000))
     end
 
     -- Output test name followed by each result
@@ -52,6 +127,37 @@ function bench.runCode(f, description)
         report = report .. "|><|" .. (v * 1000)
     end
 
+    report = report .. "|><|outliers=" .. table.concat(outliers, ",")
+    report = report .. "|><|order=" .. table.concat(orderTable, ",")
+    report = report .. "|><|clock=" .. table.concat(clockTable, ",")
+
+    if #heapAfter > 0 then
+        report = report .. "|><|heap_before=" .. table.concat(heapBefore, ",")
+        report = report .. "|><|heap_after=" .. table.concat(heapAfter, ",")
+    end
+
+    -- Peak resident set size of the VM process in KB, if the VM can report it
+    local peak = peakrss and peakrss()
+
+    if peak then
+        report = report .. "|><|maxrss=" .. peak
+    end
+
+    if #gcSteps > 0 then
+        report = report .. "|><|gc_steps=" .. table.concat(gcSteps, ",")
+        report = report .. "|><|gc_cycles=" .. table.concat(gcCycles, ",")
+        report = report .. "|><|gc_ms=" .. table.concat(gcTime, ",")
+        report = report .. "|><|gc_share=" .. table.concat(gcShare, ",")
+        report = report .. "|><|gc_pause_max=" .. table.concat(gcPauseMax, ",")
+        report = report .. "|><|gc_pause_p50=" .. table.concat(gcPauseP50, ",")
+        report = report .. "|><|gc_pause_p90=" .. table.concat(gcPauseP90, ",")
+        report = report .. "|><|gc_pause_p99=" .. table.concat(gcPauseP99, ",")
+    end
+
+    if #allocated > 0 then
+        report = report .. "|><|alloc_kb=" .. table.concat(allocated, ",")
+    end
+
     report = report .. "||_||"
 
     print(report)
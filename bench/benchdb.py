@@ -0,0 +1,80 @@
+# This file is part of the Luau programming language and is licensed under MIT License; see LICENSE.txt for details
+import array
+import json
+import sqlite3
+import sys
+
+_schema = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    test_file TEXT NOT NULL,
+    test_name TEXT NOT NULL,
+    vm_path TEXT NOT NULL,
+    vm_hash TEXT NOT NULL,
+    git_commit TEXT NOT NULL,
+    host TEXT NOT NULL,
+    flags TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    count INTEGER NOT NULL,
+    samples BLOB NOT NULL,
+    extras TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS results_by_file ON results (test_file, host, timestamp);
+CREATE INDEX IF NOT EXISTS results_by_name ON results (test_name, host, timestamp);
+CREATE INDEX IF NOT EXISTS results_by_vm ON results (vm_hash, test_file, test_name);
+"""
+
+def pack_samples(values):
+    # Samples are stored as raw little-endian doubles, which is ~3x smaller than JSON text and much faster to load
+    samples = array.array('d', values)
+    if sys.byteorder != 'little':
+        samples.byteswap()
+    return samples.tobytes()
+
+def unpack_samples(blob):
+    samples = array.array('d')
+    samples.frombytes(blob)
+    if sys.byteorder != 'little':
+        samples.byteswap()
+    return samples.tolist()
+
+class HistoryRecord:
+    def __init__(self, row):
+        (self.test_file, self.test_name, self.vm_path, self.vm_hash, self.git_commit, self.host, self.flags,
+            self.timestamp, self.count, samples, extras) = row
+
+        self.values = unpack_samples(samples)
+        self.extras = json.loads(extras)
+
+class BenchDatabase:
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(_schema)
+
+    def add_result(self, test_file, test_name, vm_path, vm_hash, git_commit, host, flags, timestamp, values, extras):
+        self.connection.execute(
+            "INSERT INTO results (test_file, test_name, vm_path, vm_hash, git_commit, host, flags, timestamp, count, samples, extras) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (test_file, test_name, vm_path, vm_hash, git_commit, host, flags, timestamp, len(values), pack_samples(values), json.dumps(extras)))
+
+    def commit(self):
+        self.connection.commit()
+
+    def query(self, test, host=None, limit=50):
+        # Test can be a file name with or without extension, or a test name; GLOB wildcards are supported and prefix matches use the indices
+        sql = ("SELECT test_file, test_name, vm_path, vm_hash, git_commit, host, flags, timestamp, count, samples, extras FROM results "
+            "WHERE (test_file GLOB ? OR test_file GLOB ? OR test_name GLOB ?)")
+        params = [test, test + '.lua', test]
+
+        if host != None:
+            sql += " AND host = ?"
+            params.append(host)
+
+        sql += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+        params.append(limit)
+
+        return [HistoryRecord(row) for row in self.connection.execute(sql, params)]
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,220 @@
+# This file is part of the Luau programming language and is licensed under MIT License; see LICENSE.txt for details
+# Result type, statistics and result files shared by bench.py and the tools around it, without the plotting and numeric packages bench.py needs
+import json
+import math
+
+# scipy takes a while to import, so it is only loaded once a confidence value is needed
+scipyStats = None
+
+def getStats():
+    global scipyStats
+
+    if scipyStats == None:
+        try:
+            from scipy import stats
+            scipyStats = stats
+        except ModuleNotFoundError:
+            scipyStats = False
+
+    return scipyStats
+
+def parseCpuList(text):
+    # Parses Linux cpulist format, e.g. "0-3,8,10-11"
+    result = []
+
+    for part in text.strip().split(","):
+        if part == "":
+            continue
+
+        if "-" in part:
+            first, last = part.split("-")
+            result += range(int(first), int(last) + 1)
+        else:
+            result.append(int(part))
+
+    return result
+
+def getResourceUsage(usage):
+    # Peak RSS is reported by the VM itself, since ru_maxrss of a child includes the peak of this process from before exec
+    return {
+        'minflt': usage.ru_minflt,
+        'majflt': usage.ru_majflt,
+        'nvcsw': usage.ru_nvcsw,
+        'nivcsw': usage.ru_nivcsw
+    }
+
+class TestResult:
+    def __init__(self):
+        self.filename = ""
+        self.vm = ""
+        self.shortVm = ""
+        self.name = ""
+
+        # Placeholder of a test that has no results for this VM, e.g. when it is missing from a results file
+        self.missing = False
+
+        # Folder the test file was found in while walking --folder
+        self.folder = ""
+
+        # Containers are created for every instance, since results are merged into each other
+        self.values = []
+        self.rounds = []
+        self.outliers = []
+        self.count = 0
+
+        # Samples of additional metrics, such as hardware performance counters
+        self.metrics = {}
+
+        # Samples of every run in execution order with their start times, including outliers
+        self.timelines = []
+
+        # Exclusive and inclusive instruction counts of each function under callgrind
+        self.functionCosts = None
+        self.min = None
+        self.avg = 0
+        self.max = None
+
+        self.sampleStdDev = 0
+        self.unbiasedEst = 0
+        self.sampleConfidenceInterval = 0
+
+        # Time, host, commit and binary hash of the run that produced a result loaded from a file
+        self.runInfo = {}
+
+        # Robust statistics over all samples, including outliers
+        self.p50 = None
+        self.p90 = None
+        self.p99 = None
+        self.mad = None
+
+def getResultExtras(result):
+    return { 'folder': result.folder, 'rounds': result.rounds, 'outliers': result.outliers, 'metrics': result.metrics, 'timelines': result.timelines }
+
+def setResultExtras(result, extras):
+    result.folder = extras.get('folder', "")
+    result.rounds = extras.get('rounds', [0] * len(result.values))
+    result.outliers = extras.get('outliers', [])
+    result.metrics = extras.get('metrics', {})
+    result.timelines = extras.get('timelines', [])
+    result.runInfo = { key: extras[key] for key in ['timestamp', 'host', 'commit', 'vmHash', 'environment'] if key in extras }
+
+def mergeResult(lhs, rhs):
+    # New containers are built so that results never share them with each other
+    lhs.values = lhs.values + rhs.values
+    lhs.rounds = lhs.rounds + rhs.rounds
+    lhs.outliers = lhs.outliers + rhs.outliers
+    lhs.metrics = { metric: lhs.metrics.get(metric, []) + rhs.metrics.get(metric, []) for metric in { **lhs.metrics, **rhs.metrics } }
+    lhs.timelines = lhs.timelines + rhs.timelines
+
+    if lhs.functionCosts == None:
+        lhs.functionCosts = rhs.functionCosts
+
+    lhs.count = len(lhs.values)
+
+def mergeResults(lhs, rhs):
+    for a, b in zip(lhs, rhs):
+        mergeResult(a, b)
+
+def finalizeResult(result):
+    total = 0.0
+
+    # Compute basic parameters
+    for v in result.values:
+        if result.min == None or v < result.min:
+            result.min = v
+
+        if result.max == None or v > result.max:
+            result.max = v
+
+        total = total + v
+
+    if result.count > 0:
+        result.avg = total / result.count
+    else:
+        result.avg = 0
+
+    # Compute standard deviation
+    sumOfSquares = 0
+
+    for v in result.values:
+        sumOfSquares = sumOfSquares + (v - result.avg) ** 2
+
+    if result.count > 1:
+        result.sampleStdDev = math.sqrt(sumOfSquares / (result.count - 1))
+        result.unbiasedEst = result.sampleStdDev * result.sampleStdDev
+
+        stats = getStats()
+
+        if stats:
+            # Two-tailed distribution with 95% conf.
+            tValue = stats.t.ppf(1 - 0.05 / 2, result.count - 1)
+
+            # Compute confidence interval
+            result.sampleConfidenceInterval = tValue * result.sampleStdDev / math.sqrt(result.count)
+        else:
+            result.sampleConfidenceInterval = result.sampleStdDev
+    else:
+        result.sampleStdDev = 0
+        result.unbiasedEst = 0
+        result.sampleConfidenceInterval = 0
+
+    return result
+
+def getSignificance(main, compare):
+    stats = getStats()
+
+    if main.count > 1 and compare.count > 1 and stats:
+        # Welch's t-test, since a baseline can have many more samples than the result it is compared with
+        mainVariance = main.unbiasedEst / main.count
+        compareVariance = compare.unbiasedEst / compare.count
+        standardError = math.sqrt(mainVariance + compareVariance)
+
+        if standardError == 0:
+            return main.avg == compare.avg, 1.0 if main.avg == compare.avg else 0.0
+
+        tStat = abs(main.avg - compare.avg) / standardError
+        degreesOfFreedom = (mainVariance + compareVariance) ** 2 / (mainVariance ** 2 / (main.count - 1) + compareVariance ** 2 / (compare.count - 1))
+
+        # Two-tailed distribution with 95% conf.
+        tCritical = stats.t.ppf(1 - 0.05 / 2, degreesOfFreedom)
+
+        noSignificantDifference = tStat < tCritical
+        pValue = 2 * (1 - stats.t.cdf(tStat, df = degreesOfFreedom))
+    else:
+        noSignificantDifference = None
+        pValue = -1
+
+    return noSignificantDifference, pValue
+
+def writeResultFile(path, results, getRunInfo=None):
+    # Results are a list of tests, each one a list of TestResult of every VM; getRunInfo adds details about the run to every result
+    class TestResultEncoder(json.JSONEncoder):
+        def default(self, obj):
+            if isinstance(obj, TestResult):
+                runInfo = getRunInfo(obj) if getRunInfo else {}
+                return [obj.filename, obj.vm, obj.shortVm, obj.name, obj.values, obj.count, { **getResultExtras(obj), **runInfo }]
+            return json.JSONEncoder.default(self, obj)
+
+    with open(path, "w") as resultsFile:
+        resultsFile.write(json.dumps(results, cls=TestResultEncoder))
+
+def decodeTestResult(arr):
+    tr = TestResult()
+
+    tr.filename = arr[0]
+    tr.vm = arr[1]
+    tr.shortVm = arr[2]
+    tr.name = arr[3]
+    tr.values = arr[4]
+    tr.count = arr[5]
+
+    # Older result files don't have the extra data
+    setResultExtras(tr, arr[6] if len(arr) > 6 else {})
+
+    return tr
+
+def loadResultFile(path):
+    with open(path) as resultsFile:
+        resultArray = json.load(resultsFile)
+
+    return [[decodeTestResult(arr) for arr in test] for test in resultArray]
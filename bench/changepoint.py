@@ -0,0 +1,260 @@
+#!/usr/bin/python
+# This file is part of the Luau programming language and is licensed under MIT License; see LICENSE.txt for details
+import argparse
+import glob
+import json
+import math
+import os
+import re
+import time
+
+from color import colored, Color
+from tabulate import TablePrinter, Alignment
+
+try:
+    from scipy import stats
+except ModuleNotFoundError:
+    stats = None
+
+def median(values):
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+
+    return ordered[middle] if len(ordered) % 2 == 1 else (ordered[middle - 1] + ordered[middle]) / 2
+
+def estimate_noise(series):
+    # Standard deviation of the noise estimated from differences of neighbours, which is not affected by the step changes themselves
+    diffs = [abs(b - a) for a, b in zip(series, series[1:])]
+
+    if len(diffs) == 0:
+        return 0.0
+
+    sigma = median(diffs) / (0.6745 * math.sqrt(2))
+
+    if sigma == 0:
+        sigma = sum(diffs) / len(diffs) / math.sqrt(2)
+
+    return sigma
+
+def find_changepoints(series, penalty=2.0, min_size=2, sigma=None):
+    """Returns indices at which the mean of the series changes, using PELT with a normal mean-change cost.
+
+    Penalty is scaled by log(n), so the default is the BIC penalty; segments are at least min_size points long."""
+    n = len(series)
+
+    if n < 2 * min_size:
+        return []
+
+    if sigma == None:
+        sigma = estimate_noise(series)
+
+    if sigma == 0:
+        sigma = max(abs(v) for v in series) * 1e-9 or 1e-9
+
+    prefix = [0.0]
+    prefix_sq = [0.0]
+
+    for value in series:
+        prefix.append(prefix[-1] + value / sigma)
+        prefix_sq.append(prefix_sq[-1] + (value / sigma) ** 2)
+
+    def cost(start, end):
+        total = prefix[end] - prefix[start]
+        return prefix_sq[end] - prefix_sq[start] - total * total / (end - start)
+
+    beta = penalty * math.log(n)
+
+    best = [math.inf] * (n + 1)
+    last = [0] * (n + 1)
+    best[0] = -beta
+    candidates = [0]
+
+    for end in range(min_size, n + 1):
+        for start in candidates:
+            if end - start >= min_size:
+                value = best[start] + cost(start, end) + beta
+
+                if value < best[end]:
+                    best[end] = value
+                    last[end] = start
+
+        # Pruning keeps the search linear in practice: a start that can't win now can't win later either
+        candidates = [start for start in candidates if end - start < min_size or best[start] + cost(start, end) <= best[end]]
+
+        if end - min_size + 1 >= min_size:
+            candidates.append(end - min_size + 1)
+
+    changepoints = []
+    end = n
+
+    while end > 0:
+        end = last[end]
+
+        if end > 0:
+            changepoints.append(end)
+
+    return sorted(changepoints)
+
+class HistoryRun:
+    def __init__(self, source, timestamp, commit, vm_hash, values):
+        self.source = source
+        self.timestamp = timestamp
+        self.commit = commit
+        self.vm_hash = vm_hash
+        self.values = values
+
+def load_result_files(paths, history):
+    files = []
+
+    for path in paths:
+        if os.path.isdir(path):
+            files += glob.glob(os.path.join(path, "*.json"))
+        else:
+            files += glob.glob(path)
+
+    for path in files:
+        try:
+            with open(path) as file:
+                result_sets = json.load(file)
+        except (OSError, ValueError) as e:
+            print(colored(Color.RED, 'WARNING') + ": skipping '" + path + "': " + str(e))
+            continue
+
+        mtime = os.path.getmtime(path)
+
+        for result_set in result_sets:
+            for arr in result_set:
+                # Same layout as bench.py results: filename, vm, short vm, name, values, count, extras
+                if len(arr[4]) == 0:
+                    continue
+
+                extras = arr[6] if len(arr) > 6 else {}
+
+                run = HistoryRun(os.path.basename(path), extras.get('timestamp', mtime), extras.get('commit', ""), extras.get('vmHash', ""), arr[4])
+                history.setdefault((arr[3], arr[2]), []).append(run)
+
+def load_database(path, test, host, history):
+    import benchdb
+
+    database = benchdb.BenchDatabase(path)
+    records = database.query(test, host, -1)
+    database.close()
+
+    for record in records:
+        driver = os.path.basename(record.vm_path) + (" " + record.flags if record.flags else "")
+        run = HistoryRun(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record.timestamp)), record.timestamp, record.git_commit, record.vm_hash, record.values)
+        history.setdefault((record.test_name, driver), []).append(run)
+
+def get_step_significance(before, after):
+    if stats == None:
+        return -1
+
+    try:
+        return stats.mannwhitneyu(before, after, alternative='two-sided').pvalue
+    except ValueError:
+        return -1
+
+def analyze_history(runs, penalty, min_size):
+    runs.sort(key=lambda run: run.timestamp)
+
+    # Each run is summarized by its median, which is robust to the occasional slow sample
+    series = [median(run.values) for run in runs]
+    changepoints = find_changepoints(series, penalty, min_size)
+
+    steps = []
+    bounds = [0] + changepoints + [len(runs)]
+
+    for i, changepoint in enumerate(changepoints):
+        before = series[bounds[i]:changepoint]
+        after = series[changepoint:bounds[i + 2]]
+
+        before_samples = [value for run in runs[bounds[i]:changepoint] for value in run.values]
+        after_samples = [value for run in runs[changepoint:bounds[i + 2]] for value in run.values]
+
+        steps.append({
+            'previous': runs[changepoint - 1],
+            'run': runs[changepoint],
+            'before': median(before),
+            'after': median(after),
+            'pvalue': get_step_significance(before_samples, after_samples)
+        })
+
+    return steps
+
+def format_run(run):
+    text = run.source
+
+    if run.commit:
+        text += " @ " + run.commit[0:10]
+    elif run.vm_hash:
+        text += " vm " + run.vm_hash[0:10]
+
+    return text
+
+def main():
+    argumentParser = argparse.ArgumentParser(description='Find step changes in the history of benchmark results')
+
+    argumentParser.add_argument('results', type=str, nargs='*', help='Result JSON files written by bench.py, or folders containing them')
+    argumentParser.add_argument('--db', dest='db', type=str, default=None, help='Read history from a bench.py --db SQLite database as well')
+    argumentParser.add_argument('--db-host', dest='db_host', type=str, default=None, help='Only use --db results from this host')
+    argumentParser.add_argument('--run-test', dest='run_test', type=str, default=None, help='Regex test name filter')
+    argumentParser.add_argument('--penalty', dest='penalty', type=float, default=2.0, help='Penalty for every step change, multiplied by log of the amount of runs (2 by default); larger values find fewer changes')
+    argumentParser.add_argument('--min-size', dest='min_size', type=int, default=2, help='Minimum amount of runs between step changes (2 by default)')
+    argumentParser.add_argument('--min-change', dest='min_change', type=float, default=0.0, help='Only report step changes larger than this percentage')
+
+    arguments = argumentParser.parse_args()
+
+    history = {}
+
+    load_result_files(arguments.results, history)
+
+    if arguments.db != None:
+        load_database(arguments.db, '*', arguments.db_host, history)
+
+    if len(history) == 0:
+        print("No results found")
+        return 1
+
+    printer = TablePrinter([
+        {'label': 'Test', 'align': Alignment.LEFT},
+        {'label': 'Driver', 'align': Alignment.LEFT},
+        {'label': 'Runs', 'align': Alignment.RIGHT},
+        {'label': 'Last good', 'align': Alignment.LEFT},
+        {'label': 'First changed', 'align': Alignment.LEFT},
+        {'label': 'Before', 'align': Alignment.RIGHT},
+        {'label': 'After', 'align': Alignment.RIGHT},
+        {'label': 'Change', 'align': Alignment.RIGHT},
+        {'label': 'P(U)', 'align': Alignment.RIGHT}
+    ])
+
+    for (name, driver), runs in sorted(history.items()):
+        if arguments.run_test != None and not re.match(arguments.run_test, name):
+            continue
+
+        for step in analyze_history(runs, arguments.penalty, arguments.min_size):
+            change = step['after'] / step['before'] - 1 if step['before'] != 0 else 0.0
+
+            if abs(change) * 100 < arguments.min_change:
+                continue
+
+            printer.add_row({
+                'Test': name,
+                'Driver': driver,
+                'Runs': str(len(runs)),
+                'Last good': format_run(step['previous']),
+                'First changed': format_run(step['run']),
+                'Before': '{:8.3f}ms'.format(step['before']),
+                'After': '{:8.3f}ms'.format(step['after']),
+                'Change': colored(Color.RED if change > 0 else Color.GREEN, '{:+8.3f}%'.format(change * 100)),
+                'P(U)': '---' if step['pvalue'] < 0 else '{:.0f}%'.format(step['pvalue'] * 100)
+            })
+
+    if printer.is_empty():
+        print("No step changes found in " + str(len(history)) + " tests")
+    else:
+        printer.print(summary=False)
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
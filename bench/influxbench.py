@@ -1,13 +1,26 @@
 # This file is part of the Luau programming language and is licensed under MIT License; see LICENSE.txt for details
+import atexit
+import functools
+import gzip
+import hashlib
+import math
 import os
 import platform
+import queue
 import shlex
 import socket
 import sys
+import threading
+import time
+import urllib.parse
 import requests
 
 _hostname = socket.gethostname()
 
+# Histogram buckets are a quarter of a power of two wide, which keeps them under 20% apart at any scale
+HISTOGRAM_BUCKETS_PER_OCTAVE = 4
+
+@functools.lru_cache(maxsize=None)
 def tag_value(value):
     value = str(value)
     for escape in [',', '=', ' ']:
@@ -23,45 +36,225 @@ def field_value(value):
     # backslash.
     return '"' + value.replace('"', '\\"') + '"'
 
+def percentile(ordered, q):
+    # Linear interpolation between the closest ranks, same as numpy.percentile
+    position = (len(ordered) - 1) * q / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(ordered) - 1)
+
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def get_histogram(samples):
+    buckets = {}
+
+    for sample in samples:
+        if sample > 0:
+            index = math.floor(math.log2(sample) * HISTOGRAM_BUCKETS_PER_OCTAVE)
+            buckets[index] = buckets.get(index, 0) + 1
+
+    # Buckets are identified by their upper bound, like Prometheus 'le' buckets
+    return [(2 ** ((index + 1) / HISTOGRAM_BUCKETS_PER_OCTAVE), count) for index, count in sorted(buckets.items())]
+
+def get_spool_path(url):
+    # Each endpoint has its own spool, so that batches are never replayed to a different database
+    name = 'influx-spool-' + hashlib.sha256(url.encode()).hexdigest()[0:16] + '.txt'
+    return os.path.join(os.path.expanduser('~'), '.cache', 'luau-bench', name)
+
 class InfluxReporter:
     def __init__(self, args):
         self.args = args
         self.lines = []
+        self.lock = threading.Lock()
+        self.batches = queue.Queue()
+        self.errors = []
+        self.thread = None
 
-    def _send_line_message(self, tags, fields):
-        tags_str = ','.join(sorted(tags))
+        # Batches of the spool file and of this run that weren't delivered yet; the spool file is only changed to match them
+        self.spooled = []
+        self.unsent = []
+        self.closed = False
+
+        # These are the same for every line, so they are only escaped once
+        self.host_tags = [
+            'hostname={}'.format(tag_value(_hostname)),
+            'is_teamcity={}'.format(tag_value('TEAMCITY_PROJECT_NAME' in os.environ)),
+            'platform={}'.format(tag_value(sys.platform)),
+            'type=event',
+
+            # Necessary in order for ElasticSearch to accept this line
+            'priority=high'
+        ]
+
+        if self.args.report_metrics:
+            self.spool = self.args.report_spool or get_spool_path(self.args.report_metrics)
+
+            # Lines that couldn't be delivered by previous runs go first
+            self.spooled = self._read_spool()
+
+            for batch in self.spooled:
+                self.batches.put((batch, True))
+
+            self.thread = threading.Thread(target=self._send_batches, daemon=True)
+            self.thread.start()
+
+            # Runs can end without reaching flush, e.g. on errors or Ctrl-C, and their lines still have to be kept
+            atexit.register(self._save_unsent)
+
+    def _read_spool(self):
+        try:
+            with open(self.spool) as file:
+                lines = [line.rstrip('\n') for line in file if line.strip()]
+        except OSError:
+            return []
+
+        if len(lines) != 0:
+            print('Replaying {} spooled lines to Influx.'.format(len(lines)))
+
+        size = self.args.report_batch_size
+        return [lines[i:i + size] for i in range(0, len(lines), size)]
+
+    def _write_spool(self, batches):
+        # Replaces the spool with the given batches, so that it never loses lines when the process stops halfway through
+        lines = [line for batch in batches for line in batch]
+
+        try:
+            if len(lines) == 0:
+                if os.path.exists(self.spool):
+                    os.remove(self.spool)
+                return True
+
+            os.makedirs(os.path.dirname(os.path.abspath(self.spool)), exist_ok=True)
+
+            with open(self.spool + '.tmp', 'w') as file:
+                file.write('\n'.join(lines) + '\n')
+
+            os.replace(self.spool + '.tmp', self.spool)
+            return True
+        except OSError as e:
+            print('Unable to spool metrics.  Reason: ' + str(e))
+            return False
+
+    def _save_unsent(self):
+        with self.lock:
+            if self.closed:
+                return
+
+            self.closed = True
+
+            if len(self.lines) != 0:
+                self.unsent.append(self.lines)
+                self.lines = []
+
+            count = sum(len(batch) for batch in self.unsent)
+
+            if self._write_spool(self.spooled + self.unsent) and count != 0:
+                print('Spooled {} unsent lines to {}, they will be sent by the next run.'.format(count, self.spool))
+
+    def _post(self, request):
+        url = urllib.parse.urlparse(self.args.report_metrics)
+
+        if url.scheme == 'file':
+            with open(urllib.parse.unquote(url.netloc + url.path), 'a') as file:
+                file.write(request + '\n')
+            return True
+
+        body = gzip.compress(request.encode(), compresslevel=6)
+        response = requests.post(url=self.args.report_metrics, data=body, headers={'Content-Encoding': 'gzip'}, timeout=30)
+
+        # Client errors are caused by the content, sending it again won't help
+        if 400 <= response.status_code < 500 and response.status_code != 429:
+            self.errors.append('Influx rejected {} lines with status {}: {}'.format(request.count('\n') + 1, response.status_code, response.text.strip()))
+            return True
+
+        response.raise_for_status()
+        return True
+
+    def _send(self, batch):
+        request = '\n'.join(batch)
+
+        for attempt in range(self.args.report_retries + 1):
+            if attempt != 0:
+                time.sleep(0.5 * 2 ** (attempt - 1))
+
+            try:
+                return self._post(request)
+            except Exception as e:
+                # We don't want a failure to report metrics to influx to result in a failed test suite.
+                # Just log a warning instead, once the tests are done, so that it doesn't interleave with the results.
+                error = str(e)
+
+        self.errors.append('Unable to report metrics to influx after {} attempts.  Reason: {}'.format(self.args.report_retries + 1, error))
+        return False
+
+    def _send_batches(self):
+        while True:
+            item = self.batches.get()
+
+            if item is None:
+                break
+
+            batch, spooled = item
+
+            if not self._send(batch):
+                # The endpoint is down, so the remaining batches stay unsent instead of waiting on retries
+                while self.batches.get() is not None:
+                    pass
+
+                return
+
+            with self.lock:
+                if self.closed:
+                    continue
+
+                if spooled:
+                    # Delivered lines are removed from the spool right away, so that they aren't sent again by the next run
+                    self.spooled.remove(batch)
+                    self._write_spool(self.spooled)
+                else:
+                    self.unsent.remove(batch)
+
+    def _send_line_message(self, tags_str, fields, measurement='robench'):
         fields_str = ','.join(fields)
-        line_message = '{},{} {}'.format('robench', tags_str, fields_str)
+        line_message = '{},{} {}'.format(measurement, tags_str, fields_str)
+
+        with self.lock:
+            self.lines.append(line_message)
+
+            # Full batches are sent in the background while the benchmarks keep running
+            if self.thread != None and len(self.lines) >= self.args.report_batch_size:
+                self._queue_lines()
 
-        self.lines.append(line_message)
         if self.args.print_influx_debugging:
             print('[influx] ' + line_message)
 
+    def _queue_lines(self):
+        self.unsent.append(self.lines)
+        self.batches.put((self.lines, False))
+        self.lines = []
+
     def flush(self, process_exit_code):
-        if self.args.report_metrics:
-            print('Reporting results to Influx.')
-            request = '\n'.join(self.lines)
-            try:
-                # We don't want a failure to report metrics to influx to result in a failed test suite.
-                # Just log a warning instead.
-                response = requests.post(url=self.args.report_metrics, data=request)
-            except Exception as e:
-                print("Unable to report metrics to influx.  Reason: " + str(e))
-                print('Request content (for debugging): ')
-                print(request)
-                pass
-
-    def report_result(self, testFolder, testName, testPath, status, timeMin, timeAvg, timeMax, confInt, vmName, vmPath):
-        is_teamcity = 'TEAMCITY_PROJECT_NAME' in os.environ
-        tags = [
-            'hostname={}'.format(tag_value(_hostname)),
-            'is_teamcity={}'.format(tag_value(is_teamcity)),
-            'platform={}'.format(tag_value(sys.platform)),
-            'type=event',
+        if self.thread == None:
+            return
 
-            # Necessary in order for ElasticSearch to accept this line
-            'priority=high',
+        print('Reporting results to Influx.')
+
+        with self.lock:
+            if len(self.lines) != 0:
+                self._queue_lines()
+
+        self.batches.put(None)
+        self.thread.join()
+        self.thread = None
 
+        for error in self.errors:
+            print(error)
+
+        self.errors = []
+
+        self._save_unsent()
+
+    def report_result(self, testFolder, testName, testPath, status, timeMin, timeAvg, timeMax, confInt, vmName, vmPath, samples=None):
+        tags = self.host_tags + [
             'test_folder={}'.format(tag_value(testFolder)),
             'test_name={}'.format(tag_value(testName)),
             'test_path={}'.format(tag_value(testPath)),
@@ -77,4 +270,25 @@ class InfluxReporter:
             'time_conf_int={}'.format(confInt)
         ]
 
-        self._send_line_message(tags, fields)
+        # Tags are shared by the result and its histogram lines
+        tags_str = ','.join(sorted(tags))
+
+        report_distribution = self.args.report_distribution and samples != None and len(samples) != 0
+
+        if report_distribution:
+            ordered = sorted(samples)
+            p50 = percentile(ordered, 50)
+
+            fields += [
+                'time_p50={}'.format(p50),
+                'time_p90={}'.format(percentile(ordered, 90)),
+                'time_p99={}'.format(percentile(ordered, 99)),
+                'time_mad={}'.format(percentile(sorted(abs(sample - p50) for sample in ordered), 50)),
+                'count={}i'.format(len(ordered))
+            ]
+
+        self._send_line_message(tags_str, fields)
+
+        if report_distribution:
+            for bound, count in get_histogram(samples):
+                self._send_line_message(tags_str + ',le={:.6g}'.format(bound), ['count={}i'.format(count)], 'robench_histogram')
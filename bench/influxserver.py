@@ -0,0 +1,97 @@
+#!/usr/bin/python
+# This file is part of the Luau programming language and is licensed under MIT License; see LICENSE.txt for details
+import argparse
+import gzip
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the InfluxDB write endpoint, so that bench.py --report-metrics can be tested offline:
+#   python influxserver.py --output received.txt --fail 2
+#   python bench.py --report-metrics http://localhost:8086/write ...
+
+# measurement,tag=value,... field=value,...
+line_pattern = re.compile(r'^[^,\s]+(,(\\.|[^\\\s])+)? (\\.|"(\\.|[^"\\])*"|[^\\\s])+( \d+)?$')
+
+class InfluxHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        server = self.server
+
+        with server.lock:
+            server.requests += 1
+            fail = server.requests <= server.arguments.fail
+
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        if fail:
+            self._respond(503, "failing the first {} requests".format(server.arguments.fail))
+            return
+
+        try:
+            if self.headers.get('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+
+            lines = [line for line in body.decode().split('\n') if line]
+        except (OSError, UnicodeDecodeError) as e:
+            self._respond(400, "unable to decode the body: " + str(e))
+            return
+
+        for line in lines:
+            if not line_pattern.match(line):
+                self._respond(400, "unable to parse '" + line + "'")
+                return
+
+        with server.lock:
+            server.lines += len(lines)
+
+            if server.arguments.output != None:
+                with open(server.arguments.output, 'a') as file:
+                    file.write('\n'.join(lines) + '\n')
+
+        print("Received {} lines ({} bytes{})".format(len(lines), self.headers.get('Content-Length', 0), ", gzip" if self.headers.get('Content-Encoding') == 'gzip' else ""))
+
+        self._respond(204, None)
+
+    def _respond(self, status, error):
+        if error != None:
+            print("Responding with {}: {}".format(status, error))
+
+        body = ('{"error":"' + error.replace('"', '\\"') + '"}').encode() if error != None else b''
+
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    argumentParser = argparse.ArgumentParser(description='Local stand-in for the InfluxDB line protocol write endpoint')
+
+    argumentParser.add_argument('--host', dest='host', type=str, default='localhost', help='Address to listen on (localhost by default)')
+    argumentParser.add_argument('--port', dest='port', type=int, default=8086, help='Port to listen on (8086 by default)')
+    argumentParser.add_argument('--output', dest='output', type=str, default=None, help='File to append received lines to')
+    argumentParser.add_argument('--fail', dest='fail', type=int, default=0, help='Respond with 503 to this amount of requests first, to test retries and spooling')
+
+    arguments = argumentParser.parse_args()
+
+    server = ThreadingHTTPServer((arguments.host, arguments.port), InfluxHandler)
+    server.arguments = arguments
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.lines = 0
+
+    print("Listening on http://{}:{}/write".format(arguments.host, server.server_port))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+    print("Received {} lines in {} requests".format(server.lines, server.requests))
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -1,43 +1,269 @@
+#!/usr/bin/python
 # This file is part of the Luau programming language and is licensed under MIT License; see LICENSE.txt for details
-import os, sys, time, numpy 
+import argparse
+import math
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
 
 try:
-  import scipy
-  from scipy import mean, stats
+    import resource
 except ModuleNotFoundError:
-  print("Warning: scipy package is not installed, confidence values will not be available")
-  stats = None
+    resource = None
 
-duration_list = []
+from color import colored, Color
+from tabulate import TablePrinter, Alignment
 
-DEFAULT_CYCLES_TO_RUN = 100
-cycles_to_run = DEFAULT_CYCLES_TO_RUN
+import benchresult
 
-try:
-  cycles_to_run = sys.argv[3] if sys.argv[3] else DEFAULT_CYCLES_TO_RUN
-  cycles_to_run = int(cycles_to_run)
-except IndexError:
-  pass
-except (ValueError, TypeError):
-  cycles_to_run = DEFAULT_CYCLES_TO_RUN
-  print("Error: Cycles to run argument must be an integer. Using default value of {}".format(DEFAULT_CYCLES_TO_RUN))
+# Samples further than this many standard deviations (estimated from the median absolute deviation) above the median are outliers
+OUTLIER_THRESHOLD = 3.0
+
+class Command:
+    def __init__(self, name, command):
+        self.name = name
+        self.command = command
+        self.args = shlex.split(command, posix=os.name != "nt")
+        self.samples = []
+        self.cpu = []
+        self.usage = {}
+        self.failures = 0
+
+def run_command(arguments, command, core):
+    output = None if arguments.show_output else subprocess.DEVNULL
+
+    # Monotonic clock, and no shell in between, so that only the command itself is measured
+    start = time.perf_counter()
+
+    process = subprocess.Popen(command.args, stdout=output, stderr=output)
+
+    if core != None:
+        try:
+            os.sched_setaffinity(process.pid, { core })
+        except OSError:
+            pass
+
+    if hasattr(os, "wait4"):
+        pid, status, usage = os.wait4(process.pid, 0)
+        end = time.perf_counter()
+
+        process.returncode = os.waitstatus_to_exitcode(status)
+    else:
+        process.wait()
+        end = time.perf_counter()
+
+        usage = None
+
+    return process.returncode, (end - start) * 1000, usage
+
+def measure(arguments, command, core, runs, record):
+    for i in range(runs):
+        exit_code, duration, usage = run_command(arguments, command, core)
+
+        if exit_code != 0:
+            command.failures += 1
+            continue
+
+        if not record:
+            continue
+
+        command.samples.append(duration)
+
+        if usage != None:
+            command.cpu.append((usage.ru_utime + usage.ru_stime) * 1000)
+
+            for key, value in benchresult.getResourceUsage(usage).items():
+                command.usage.setdefault(key, []).append(value)
+
+            # ru_maxrss of a child starts from the peak of this process, so it only measures the command when it is above that
+            if resource != None and usage.ru_maxrss > resource.getrusage(resource.RUSAGE_SELF).ru_maxrss:
+                command.usage.setdefault('maxrss', []).append(usage.ru_maxrss / 1024 if sys.platform == "darwin" else usage.ru_maxrss)
+
+def run_sequential(arguments, commands, core):
+    for command in commands:
+        measure(arguments, command, core, arguments.warmup, False)
+
+    # Runs of different commands are interleaved, so that a slow drift of the machine affects all of them equally
+    for i in range(arguments.runs):
+        for command in (commands if i % 2 == 0 else reversed(commands)):
+            measure(arguments, command, core, 1, True)
+
+def run_parallel(arguments, commands, cores):
+    def worker(command, core):
+        measure(arguments, command, core, arguments.warmup, False)
+        measure(arguments, command, core, arguments.runs, True)
+
+    threads = [threading.Thread(target=worker, args=(command, core)) for command, core in zip(commands, cores)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+def percentile(ordered, q):
+    position = (len(ordered) - 1) * q / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(ordered) - 1)
+
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def get_result(arguments, command):
+    ordered = sorted(command.samples)
+
+    result = benchresult.TestResult()
+
+    result.filename = arguments.test
+    result.vm = command.command
+    result.shortVm = command.name
+    result.name = arguments.test
+
+    if len(ordered) != 0:
+        median = percentile(ordered, 50)
+        mad = percentile(sorted(abs(sample - median) for sample in ordered), 50)
+        limit = median + OUTLIER_THRESHOLD * 1.4826 * mad if mad > 0 else math.inf
+
+        result.values = [sample for sample in ordered if sample <= limit]
+        result.outliers = [sample for sample in ordered if sample > limit]
+
+        result.p50, result.p90, result.p99 = [percentile(ordered, q) for q in [50, 90, 99]]
+        result.mad = mad
+    else:
+        result.values = []
+        result.outliers = []
+
+    result.count = len(result.values)
+    result.rounds = [0] * result.count
+    result.metrics = { **command.usage, 'cpu_ms': command.cpu }
+    result.timelines = []
+
+    return result
+
+def get_cores(arguments, count):
+    if not hasattr(os, "sched_getaffinity"):
+        return [None] * count
+
+    if arguments.cores != None:
+        cores = benchresult.parseCpuList(arguments.cores)
+    else:
+        cores = sorted(os.sched_getaffinity(0))
+
+    if len(cores) < count:
+        print(colored(Color.YELLOW, 'WARNING') + ": " + str(count) + " commands share " + str(len(cores)) + " cores")
+
+    return [cores[i % len(cores)] for i in range(count)]
+
+def main():
+    argumentParser = argparse.ArgumentParser(description='Measure the time it takes to run whole commands, such as luau or luau-analyze invocations')
+
+    argumentParser.add_argument('commands', type=str, nargs='+', help='Commands to measure; each one is split into arguments like a shell would, but runs without a shell')
+    argumentParser.add_argument('--name', dest='names', type=str, action='append', default=[], help='Name of a command in the results, in the same order as the commands (the command line by default)')
+    argumentParser.add_argument('--runs', dest='runs', type=int, default=100, help='Amount of measured runs of each command (100 by default)')
+    argumentParser.add_argument('--warmup', dest='warmup', type=int, default=3, help='Amount of runs of each command before measurements start (3 by default)')
+    argumentParser.add_argument('--parallel', dest='parallel', action='store_true', help='Run the commands at the same time, each one pinned to its own core')
+    argumentParser.add_argument('--cores', dest='cores', type=str, default=None, help='Cores to pin the commands to, in Linux cpulist format (e.g. 2-3); without --parallel, only the first one is used')
+    argumentParser.add_argument('--test', dest='test', type=str, default='command', help='Test name of the measurements in the results (command by default)')
+    argumentParser.add_argument('--filename', dest='filename', type=str, default=None, help='Write the results to FILENAME.json in the same format as bench.py, to be used with bench.py --results')
+    argumentParser.add_argument('--show-output', dest='show_output', action='store_true', help='Show output of the commands')
+
+    arguments = argumentParser.parse_args()
+
+    if len(arguments.names) > len(arguments.commands):
+        print("More names than commands were specified")
+        return 1
+
+    commands = [Command(arguments.names[i] if i < len(arguments.names) else command, command) for i, command in enumerate(arguments.commands)]
+
+    cores = get_cores(arguments, len(commands) if arguments.parallel else 1)
+
+    try:
+        if arguments.parallel:
+            run_parallel(arguments, commands, cores)
+        else:
+            run_sequential(arguments, commands, cores[0])
+    except OSError as e:
+        print(colored(Color.RED, "FAILED") + ": " + str(e))
+        return 1
+
+    results = [get_result(arguments, command) for command in commands]
+
+    for result in results:
+        benchresult.finalizeResult(result)
+
+    printer = TablePrinter([
+        {'label': 'Command', 'align': Alignment.LEFT},
+        {'label': 'Median', 'align': Alignment.RIGHT},
+        {'label': 'P90', 'align': Alignment.RIGHT},
+        {'label': 'P99', 'align': Alignment.RIGHT},
+        {'label': 'MAD%', 'align': Alignment.RIGHT},
+        {'label': 'Min', 'align': Alignment.RIGHT},
+        {'label': 'Average', 'align': Alignment.RIGHT},
+        {'label': 'CPU', 'align': Alignment.RIGHT},
+        {'label': 'Peak RSS', 'align': Alignment.RIGHT},
+        {'label': 'Outliers', 'align': Alignment.RIGHT},
+        {'label': 'Speedup', 'align': Alignment.RIGHT},
+        {'label': 'Significance', 'align': Alignment.LEFT}
+    ])
+
+    main_result = results[0]
+
+    for command, result in zip(commands, results):
+        if result.count == 0:
+            printer.add_row({ 'Command': command.name, 'Median': "FAILED" })
+            continue
+
+        speedup = ""
+        significance = ""
+
+        if result is not main_result and main_result.count != 0:
+            speedup = main_result.p50 / result.p50 - 1
+            no_significant_difference, p_value = benchresult.getSignificance(main_result, result)
+
+            if no_significant_difference is None:
+                significance = ""
+            elif no_significant_difference:
+                significance = "likely same"
+            elif speedup > 0:
+                significance = colored(Color.GREEN, "likely better")
+            else:
+                significance = colored(Color.RED, "likely worse")
+
+            speedup = colored(Color.GREEN if speedup > 0 else Color.RED, '{:+7.2f}%'.format(speedup * 100))
+
+        printer.add_row({
+            'Command': command.name,
+            'Median': '{:8.3f}ms'.format(result.p50),
+            'P90': '{:8.3f}ms'.format(result.p90),
+            'P99': '{:8.3f}ms'.format(result.p99),
+            'MAD%': '{:6.2f}%'.format(result.mad / result.p50 * 100) if result.p50 > 0 else "---",
+            'Min': '{:8.3f}ms'.format(result.min),
+            'Average': '{:8.3f}ms'.format(result.avg),
+            'CPU': '{:8.3f}ms'.format(percentile(sorted(command.cpu), 50)) if len(command.cpu) != 0 else "---",
+            'Peak RSS': '{:.1f}MB'.format(max(command.usage['maxrss']) / 1024) if 'maxrss' in command.usage else "---",
+            'Outliers': str(len(result.outliers)),
+            'Speedup': speedup,
+            'Significance': significance
+        })
 
-# Numpy complains if we provide a cycle count of less than 3 ~ default to 3 whenever a lower value is provided
-cycles_to_run = cycles_to_run if cycles_to_run > 2 else 3
+    printer.print(summary=False)
 
-for i in range(1,cycles_to_run):
-  start = time.perf_counter()
-  
-  # Run the code you want to measure here
-  os.system(sys.argv[1])
+    failed = False
 
-  end = time.perf_counter()
+    for command in commands:
+        if command.failures != 0:
+            print(colored(Color.RED, 'WARNING') + ": '" + command.name + "' exited with an error " + str(command.failures) + " times, these runs are excluded")
+            failed = True
 
-  duration_ms = (end - start) * 1000
-  duration_list.append(duration_ms)
+    if arguments.filename != None:
+        try:
+            benchresult.writeResultFile(arguments.filename + ".json", [results])
+        except OSError:
+            print("Failed to write results to a file")
 
-# Stats
-mean = numpy.mean(duration_list)
-std_err = stats.sem(duration_list)
+    return 1 if failed else 0
 
-print("SUCCESS: {} : {:.2f}ms +/- {:.2f}% on luau ".format('duration', mean,std_err))
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,263 @@
+#!/usr/bin/python
+# This file is part of the Luau programming language and is licensed under MIT License; see LICENSE.txt for details
+import argparse
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from color import colored, Color
+
+import benchresult
+
+scriptdir = os.path.dirname(os.path.realpath(__file__))
+
+def git(*args):
+    return subprocess.check_output(["git"] + list(args), cwd=scriptdir, text=True).strip()
+
+def get_commit_subject(commit):
+    return git("log", "-1", "--format=%s", commit)
+
+class Builder:
+    def __init__(self, arguments, cores):
+        self.arguments = arguments
+        self.cores = cores
+        self.repository = git("rev-parse", "--show-toplevel")
+        self.executor = ThreadPoolExecutor(max_workers=arguments.parallel_builds)
+        self.builds = {}
+
+        # Different CMake arguments produce different binaries, so they are a part of the cache key
+        self.configuration = hashlib.sha256(" ".join(arguments.cmake_args).encode()).hexdigest()[0:8]
+
+    def _isolate(self):
+        # Builds stay off the cores used for measurements; the affinity of the calling worker thread is inherited by the processes it starts
+        if self.cores:
+            os.sched_setaffinity(0, self.cores)
+
+    def get_path(self, commit):
+        return os.path.join(self.arguments.cache, commit + "-" + self.configuration, "luau.exe" if os.name == "nt" else "luau")
+
+    def _build(self, commit):
+        path = self.get_path(commit)
+
+        if os.path.exists(path):
+            return path
+
+        self._isolate()
+
+        worktree = os.path.join(self.arguments.cache, "worktrees", commit)
+        build = os.path.join(worktree, "build")
+
+        if os.path.exists(worktree):
+            subprocess.call(["git", "worktree", "remove", "--force", worktree], cwd=self.repository, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        print(colored(Color.BLUE, "BUILDING") + ": " + commit[0:10] + " " + get_commit_subject(commit))
+
+        with open(os.path.join(self.arguments.cache, commit + ".log"), "w") as log:
+            try:
+                subprocess.check_call(["git", "worktree", "add", "--detach", worktree, commit], cwd=self.repository, stdout=log, stderr=log)
+                subprocess.check_call(["cmake", "-S", worktree, "-B", build, "-DCMAKE_BUILD_TYPE=RelWithDebInfo"] + self.arguments.cmake_args, stdout=log, stderr=log)
+                subprocess.check_call(["cmake", "--build", build, "--target", "Luau.Repl.CLI", "--config", "RelWithDebInfo", "-j", str(self.arguments.build_jobs)], stdout=log, stderr=log)
+
+                # Multi-config generators put the binary into a subfolder
+                for candidate in [os.path.join(build, os.path.basename(path)), os.path.join(build, "RelWithDebInfo", os.path.basename(path))]:
+                    if os.path.exists(candidate):
+                        os.makedirs(os.path.dirname(path), exist_ok=True)
+                        shutil.copy2(candidate, path)
+                        break
+            except subprocess.CalledProcessError:
+                pass
+            finally:
+                subprocess.call(["git", "worktree", "remove", "--force", worktree], cwd=self.repository, stdout=log, stderr=log)
+
+        if not os.path.exists(path):
+            print(colored(Color.RED, "FAILED") + ": build of " + commit[0:10] + ", see " + log.name)
+            return None
+
+        return path
+
+    def prepare(self, commit):
+        # Builds are started ahead of time, so that the next candidates are ready when measurements finish
+        if commit not in self.builds:
+            self.builds[commit] = self.executor.submit(self._build, commit)
+
+        return self.builds[commit]
+
+    def get(self, commit):
+        return self.prepare(commit).result()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+def measure(arguments, good, candidate):
+    # Returns the largest significant slowdown of the candidate compared to the good binary, or None if there is none
+    with tempfile.TemporaryDirectory() as folder:
+        filename = os.path.join(folder, "bisect")
+
+        cmd = [sys.executable, os.path.join(scriptdir, "bench.py"), "--vm", good, "--compare", candidate, "--folder", arguments.folder,
+            "--filename", filename, "--order", "abba", "--extra-loops", str(arguments.extra_loops), "--no-print-final-summary"]
+
+        if arguments.run_test != None:
+            cmd += ["--run-test", arguments.run_test]
+
+        if arguments.cores != None:
+            cmd += ["--cores", arguments.cores]
+
+        subprocess.call(cmd, cwd=scriptdir, stdout=subprocess.DEVNULL if not arguments.verbose else None)
+
+        try:
+            result_sets = benchresult.loadResultFile(filename + ".json")
+        except (OSError, ValueError):
+            return None, []
+
+    slowdown = None
+    tests = []
+
+    for result_set in result_sets:
+        main, compare = [benchresult.finalizeResult(result) for result in result_set[0:2]]
+
+        if main.count == 0 or compare.count == 0:
+            continue
+
+        # Same significance test as the comparison tables of bench.py
+        no_significant_difference, p_value = benchresult.getSignificance(main, compare)
+        change = compare.avg / main.avg - 1
+
+        tests.append((main.name, change, no_significant_difference))
+
+        if no_significant_difference != True and change * 100 > arguments.threshold:
+            slowdown = change if slowdown == None else max(slowdown, change)
+
+    return slowdown, tests
+
+def classify(arguments, builder, good, commit):
+    path = builder.get(commit)
+
+    if path == None:
+        return None
+
+    slowdown, tests = measure(arguments, good, path)
+
+    if len(tests) == 0:
+        print(colored(Color.RED, "SKIPPED") + ": " + commit[0:10] + " didn't produce any results")
+        return None
+
+    for name, change, no_significant_difference in tests:
+        if no_significant_difference is None:
+            verdict = ""
+        elif no_significant_difference:
+            verdict = "likely same"
+        elif change > 0:
+            verdict = "likely worse"
+        else:
+            verdict = "likely better"
+
+        print("    {:<40}: {:+8.3f}% {}".format(name, change * 100, verdict))
+
+    is_bad = slowdown != None
+
+    print(colored(Color.RED if is_bad else Color.GREEN, "BAD" if is_bad else "GOOD") + ": " + commit[0:10] + " " + get_commit_subject(commit))
+
+    return is_bad
+
+def main():
+    argumentParser = argparse.ArgumentParser(description='Find the first commit that made a benchmark slower')
+
+    argumentParser.add_argument('good', type=str, help='Commit without the regression')
+    argumentParser.add_argument('bad', type=str, help='Commit with the regression')
+    argumentParser.add_argument('--run-test', dest='run_test', type=str, default=None, help='Regex test filter, same as bench.py')
+    argumentParser.add_argument('--folder', dest='folder', type=str, default=os.path.join(scriptdir, 'tests'), help='Folder with tests (tests by default)')
+    argumentParser.add_argument('--threshold', dest='threshold', type=float, default=2.0, help='Significant slowdown percentage after which a commit is considered bad (2 by default)')
+    argumentParser.add_argument('--extra-loops', dest='extra_loops', type=int, default=4, help='Amount of extra loops of each bench.py comparison (4 by default)')
+    argumentParser.add_argument('--cores', dest='cores', type=str, default=None, help='Cores to run benchmarks on, passed to bench.py --cores; keep them separate from the cores used by builds')
+    argumentParser.add_argument('--parallel-builds', dest='parallel_builds', type=int, default=2, help='Amount of commits to build at the same time (2 by default)')
+    argumentParser.add_argument('--build-jobs', dest='build_jobs', type=int, default=4, help='Amount of compiler processes of each build (4 by default)')
+    argumentParser.add_argument('--cmake-args', dest='cmake_args', type=str, nargs='*', default=[], help='Extra arguments for CMake configuration')
+    argumentParser.add_argument('--cache', dest='cache', type=str, default=os.path.join(os.path.expanduser('~'), '.cache', 'luau-bisect'), help='Folder with built binaries of every commit')
+    argumentParser.add_argument('--verbose', dest='verbose', action='store_true', help='Show bench.py output')
+
+    arguments = argumentParser.parse_args()
+    arguments.cache = os.path.abspath(arguments.cache)
+    arguments.folder = os.path.abspath(arguments.folder)
+
+    os.makedirs(os.path.join(arguments.cache, "worktrees"), exist_ok=True)
+
+    good = git("rev-parse", arguments.good)
+    bad = git("rev-parse", arguments.bad)
+
+    # Only commits that are descendants of the good commit and ancestors of the bad one can introduce the regression
+    commits = git("rev-list", "--reverse", "--ancestry-path", good + ".." + bad).split()
+
+    if len(commits) == 0 or commits[-1] != bad:
+        print("'" + arguments.bad + "' is not a descendant of '" + arguments.good + "'")
+        return 1
+
+    build_cores = None
+
+    if arguments.cores != None and hasattr(os, "sched_getaffinity"):
+        build_cores = set(os.sched_getaffinity(0)) - set(benchresult.parseCpuList(arguments.cores))
+
+    builder = Builder(arguments, build_cores)
+
+    try:
+        builder.prepare(good)
+        builder.prepare(bad)
+
+        good_path = builder.get(good)
+
+        if good_path == None:
+            return 1
+
+        print("Bisecting " + str(len(commits)) + " commits")
+
+        if classify(arguments, builder, good_path, bad) != True:
+            print("'" + arguments.bad + "' is not slower than '" + arguments.good + "' by more than " + str(arguments.threshold) + "%")
+            return 1
+
+        # Invariant: commits[low - 1] (or the good commit) is good, commits[high] is bad
+        low, high = 0, len(commits) - 1
+        skipped = set()
+
+        while low < high:
+            candidates = [i for i in range(low, high) if i not in skipped]
+
+            if len(candidates) == 0:
+                break
+
+            middle = candidates[len(candidates) // 2]
+
+            # Build the midpoints of both possible halves while this one is measured
+            builder.prepare(commits[middle])
+
+            for next_candidates in [[i for i in candidates if i < middle], [i for i in candidates if i > middle]]:
+                if len(next_candidates) != 0:
+                    builder.prepare(commits[next_candidates[len(next_candidates) // 2]])
+
+            is_bad = classify(arguments, builder, good_path, commits[middle])
+
+            if is_bad == None:
+                skipped.add(middle)
+            elif is_bad:
+                high = middle
+            else:
+                low = middle + 1
+
+        print()
+
+        if any(i in skipped for i in range(low, high)):
+            print("First bad commit is one of:")
+
+            for i in range(low, high + 1):
+                print("  " + commits[i][0:10] + " " + get_commit_subject(commits[i]))
+        else:
+            print(colored(Color.RED, "First bad commit") + ": " + commits[high] + " " + get_commit_subject(commits[high]))
+
+        return 0
+    finally:
+        builder.shutdown()
+
+if __name__ == "__main__":
+    exit(main())
@@ -17,9 +17,10 @@ class TablePrinter(object):
         pass
 
     def _convert_field_dict_to_ordered_list(self, fields:Dict[str, object]):
-        assert(len(fields) == len(self._columns))
+        assert(len(fields) <= len(self._columns))
 
-        ordered_list = [None] * len(self._columns)
+        # Columns that aren't specified are left empty
+        ordered_list = [''] * len(self._columns)
         column_names = [column['label'] for column in self._columns]
 
         for column, value in fields.items():
@@ -62,6 +63,9 @@ class TablePrinter(object):
 
         self._rows.append(fields)
 
+    def is_empty(self):
+        return len(self._rows) == 0
+
     def _compute_summary_row(self):
         sums = [0] * len(self._widths)
         for row in self._rows: